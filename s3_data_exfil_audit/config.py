@@ -4,4 +4,28 @@
 event_data_store_id = ""
 
 # Event time filter - the start datetime for the audit capture
-event_time_filter = "YYYY-MM-DD 00:00:00"
\ No newline at end of file
+event_time_filter = "YYYY-MM-DD 00:00:00"
+
+# Query status polling - wait poll_interval seconds after starting a query, then
+# back off exponentially (x2) up to poll_interval_max seconds between describe_query calls
+poll_interval = 1
+poll_interval_max = 30
+
+# Give up (and cancel the query) if it has not finished after this many seconds
+query_timeout = 3600
+
+# Time slicing - the audit window (event_time_filter to now) is split into slices of
+# slice_hours, queried concurrently; keep max_concurrent_queries at or below the
+# account's CloudTrail Lake concurrent query quota
+slice_hours = 24
+max_concurrent_queries = 5
+
+# Results of completed slices are cached in this folder (next to the script), so
+# re-runs only query new time ranges. Slices ending less than slice_cache_delay_minutes
+# ago are always re-queried, as CloudTrail may still be delivering their events.
+slice_cache_dir = ".s3audit_cache"
+slice_cache_delay_minutes = 60
+
+# Incremental mode (--incremental) - each run re-queries this many minutes before its
+# watermark to pick up events CloudTrail delivers late; already-reported events are skipped
+incremental_lookback_minutes = 15
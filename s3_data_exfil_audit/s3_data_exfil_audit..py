@@ -1,55 +1,288 @@
+import argparse
 import time
 import sys
 import csv
 import json
+import hashlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from pathlib import Path, PurePath
 import boto3
 from config import *
 
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+ACCOUNT_CHUNK_SIZE = 500  # account IDs per NOT IN list in the query
+COLUMNS = ["eventTime","eventSource","sourceIPAddress","eventName","DestinationBucket","SourceAccountID","RecipientAccountID","eventID"]
+
 
 # Validate input arguments
-if len(sys.argv) != 2:
-    print(f"\nMissing input argument!\nUSAGE: python3 {sys.argv[0]} <file name>\nwhere <file name> is the name of the file containing a single column of authorized AWS Account IDs.\n")
-    exit(1)
+parser = argparse.ArgumentParser(description="Audit S3 writes to external buckets in unauthorized AWS accounts with CloudTrail Lake.")
+parser.add_argument('accounts',
+                    help='Name of the file containing a single column of authorized AWS Account IDs')
+parser.add_argument('--incremental', action='store_true',
+                    help='Only query events newer than the watermark in --state-file and append them to daily output files')
+parser.add_argument('--interval', type=float,
+                    help='With --incremental, keep running and repeat every INTERVAL minutes (default: run once, e.g. from cron)')
+parser.add_argument('--state-file',
+                    help='Watermark file for --incremental (default: <accounts>_s3audit_state.json next to the script)')
+args = parser.parse_args()
+if args.interval and not args.incremental:
+    parser.error('--interval requires --incremental')
 
-accounts = sys.argv[1]
+accounts = args.accounts
 script_dir = Path((PurePath(sys.argv[0]).parent)).resolve(strict=True)
-results_json = script_dir / f'{PurePath(accounts).stem}_s3audit.json'
+results_json = script_dir / f'{PurePath(accounts).stem}_s3audit.jsonl'
 results_csv = script_dir / f'{PurePath(accounts).stem}_s3audit.csv'
+state_file = Path(args.state_file) if args.state_file else script_dir / f'{PurePath(accounts).stem}_s3audit_state.json'
+slice_cache = script_dir / slice_cache_dir
+
+# Read list of authorized AWS Account IDs (comments and blank lines are skipped)
+with open(accounts,'r') as a:
+    a_list = [line.split('#', 1)[0].strip() for line in a.read().splitlines()]
+a_list = [account for account in a_list if account]
+invalid = [account for account in a_list if not re.fullmatch(r'\d{12}', account)]
+if invalid:
+    print(f"\nInvalid AWS Account IDs in {accounts}: {', '.join(invalid)}\n")
+    exit(1)
+authorized = set(a_list)
 
-# Create CloudTrail client
+# Create CloudTrail client (shared by the slice queries)
 client = boto3.client('cloudtrail')
 
-# Prepare CloudTrail Lake Query
-cloudtrail_lake_query = (f"SELECT eventTime, eventSource, sourceIPAddress, eventName, element_at(requestParameters, 'bucketName') AS DestinationBucket, userIdentity.accountid AS SourceAccountID, element_at(resources,2).accountid AS RecipientAccountID" # Select specific columns from event data store
-                         f" FROM {event_data_store_id}" 
-                         f" WHERE eventTime > '{event_time_filter}'"
-                         f" AND eventName IN ('PutObject','CopyObject','CreateMultipartUpload','UploadPart','UploadPartCopy','CompleteMultipartUpload','PostObject')" # check data exfiltration to S3
-                         f" ORDER BY eventTime DESC"
-                         )
 
-# Execute CloudTrail Lake Query
-start_query = client.start_query(QueryStatement=cloudtrail_lake_query)
-query_id = start_query['QueryId']
+def time_slices(start, end, hours):
+    """Split [start, end) into consecutive slices of the given length."""
+    slices = []
+    while start < end:
+        slices.append((start, min(start + timedelta(hours=hours), end)))
+        start = slices[-1][1]
+    return slices
 
-# Wait for query execution to complete
-while client.get_query_results(QueryId=query_id)['QueryStatus'] != "FINISHED":
-    time.sleep(1)
 
-# Write query results to JSON file - don't need this step, but useful for analysis/troubleshooting
-with open(results_json,'w') as rj:
-    data = client.get_query_results(QueryId=query_id)
-    rj.write(json.dumps(data))
+def recipient_filter(accounts):
+    """
+    SQL predicate keeping events whose recipient account is not authorized,
+    with the allow-list split into NOT IN lists of ACCOUNT_CHUNK_SIZE IDs.
+    Events without a recipient account are dropped, as before.
+    """
+    recipient = "element_at(resources,2).accountid"
+    ids = sorted(accounts)
+    chunks = [ids[i:i + ACCOUNT_CHUNK_SIZE] for i in range(0, len(ids), ACCOUNT_CHUNK_SIZE)]
+    return " AND ".join(
+        [f"{recipient} IS NOT NULL"] +
+        [f"{recipient} NOT IN ({', '.join(repr(account) for account in chunk)})" for chunk in chunks]
+    )
 
-# Read list of authorized AWS Account IDs
-with open(accounts,'r') as a:
-    a_list = a.read().splitlines()
-
-# Parse query results and extract data for unauthorized AWS Account IDs in CSV format
-with open(results_csv,'w',newline='') as r:
-    writer = csv.writer(r)
-    writer.writerow(["eventTime","eventSource","sourceIPAddress","eventName","DestinationBucket","SourceAccountID","RecipientAccountID"])
-    for qrr in data['QueryResultRows']:
-        for qr in qrr:
-            if "RecipientAccountID" in qr and qr['RecipientAccountID'] not in a_list:
-                writer.writerow([qrr[0]['eventTime'],qrr[1]['eventSource'],qrr[2]['sourceIPAddress'],qrr[3]['eventName'],qrr[4]['DestinationBucket'],qrr[5]['SourceAccountID'],qrr[6]['RecipientAccountID']])
+
+def slice_query(start, end):
+    """CloudTrail Lake query for one time slice, sorted by time (cheap: each slice is small)."""
+    return (f"SELECT eventTime, eventSource, sourceIPAddress, eventName, element_at(requestParameters, 'bucketName') AS DestinationBucket, userIdentity.accountid AS SourceAccountID, element_at(resources,2).accountid AS RecipientAccountID, eventID" # Select specific columns from event data store
+            f" FROM {event_data_store_id}"
+            f" WHERE eventTime >= '{start.strftime(TIME_FORMAT)}' AND eventTime < '{end.strftime(TIME_FORMAT)}'"
+            f" AND eventName IN ('PutObject','CopyObject','CreateMultipartUpload','UploadPart','UploadPartCopy','CompleteMultipartUpload','PostObject')" # check data exfiltration to S3
+            f" AND {recipient_filter(authorized)}" # only events to unauthorized accounts
+            f" ORDER BY eventTime" # slices are concatenated in order, so the output is sorted by time
+            )
+
+
+def wait_for_query(client, query_id):
+    """
+    Poll describe_query (which returns no result rows) with exponential backoff
+    until the query finishes. Returns its QueryStatistics; raises RuntimeError
+    if the query fails, is cancelled, times out or outlasts query_timeout.
+    """
+    deadline = time.monotonic() + query_timeout
+    interval = poll_interval
+    while True:
+        time.sleep(min(interval, max(0, deadline - time.monotonic())))
+        query = client.describe_query(QueryId=query_id)
+        status = query['QueryStatus']
+        if status == 'FINISHED':
+            return query.get('QueryStatistics', {})
+        if status in ('FAILED', 'CANCELLED', 'TIMED_OUT'):
+            raise RuntimeError(f"query {query_id} ended with status {status}: {query.get('ErrorMessage') or 'no error message'}")
+        if time.monotonic() >= deadline:
+            client.cancel_query(QueryId=query_id)
+            raise RuntimeError(f"query {query_id} did not finish within {query_timeout} seconds and was cancelled")
+        interval = min(interval * 2, poll_interval_max)
+
+
+def query_result_rows(client, query_id):
+    """Yield every result row of a finished query, one get_query_results page at a time."""
+    kwargs = {'QueryId': query_id}
+    while True:
+        page = client.get_query_results(**kwargs)
+        for row in page.get('QueryResultRows', []):
+            # Each row is a list of single-column dicts; merge them into one record
+            yield {column: value for field in row for column, value in field.items()}
+        if not page.get('NextToken'):
+            return
+        kwargs['NextToken'] = page['NextToken']
+
+
+def run_slice(start, end, settled_before=None):
+    """
+    Run the query for one time slice and stream its rows to a JSON Lines file.
+    Slices that ended before settled_before are complete, so their file is kept
+    in the slice cache (keyed by a hash of the query) and reused by later runs;
+    settled_before=None disables the cache.
+    Returns (rows file, whether it came from the cache, query statistics).
+    """
+    query = slice_query(start, end)
+    cached = slice_cache / f"{hashlib.sha256(query.encode('utf-8')).hexdigest()}.jsonl"
+    if settled_before is not None and cached.exists():
+        return cached, True, {}
+
+    query_id = client.start_query(QueryStatement=query)['QueryId']
+    stats = wait_for_query(client, query_id)
+    tmp = slice_cache / f'{cached.stem}.{os.getpid()}.tmp'
+    try:
+        with open(tmp, 'w') as f:
+            for record in query_result_rows(client, query_id):
+                f.write(json.dumps(record) + '\n')
+    except BaseException:
+        # Don't leave a partial file behind when paging fails
+        tmp.unlink(missing_ok=True)
+        raise
+    if settled_before is not None and end <= settled_before:
+        os.replace(tmp, cached)
+        return cached, False, stats
+    return tmp, False, stats
+
+
+def audit(window_start, window_end, json_path, csv_path, append=False, use_cache=True, seen=None):
+    """
+    Query [window_start, window_end) in time slices, queried concurrently, and write the
+    events to the JSON Lines and CSV files (appending when append=True). Events whose
+    eventID is in seen were already reported and are skipped.
+    Returns ({eventID: eventTime} of the events written, start of the first failed slice or None).
+    """
+    slices = time_slices(window_start, window_end, slice_hours)
+    settled_before = window_end - timedelta(minutes=slice_cache_delay_minutes) if use_cache else None
+    slice_cache.mkdir(parents=True, exist_ok=True)
+
+    def run(bounds):
+        try:
+            return run_slice(*bounds, settled_before)
+        except Exception as e:
+            return None, False, e
+
+    # Each slice is sorted by time, so concatenating them in slice order keeps the rows sorted
+    # Write every returned row to the JSON Lines file (useful for analysis/troubleshooting) and to the CSV file
+    mode = 'a' if append else 'w'
+    write_header = not append or not csv_path.exists() or csv_path.stat().st_size == 0
+    written = {}
+    total = reported = duplicates = queried = bytes_scanned = 0
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_concurrent_queries) as executor, \
+            open(json_path, mode) as rj, open(csv_path, mode, newline='') as r:
+        writer = csv.writer(r)
+        if write_header:
+            writer.writerow(COLUMNS)
+        for (start, end), (rows_file, from_cache, stats) in zip(slices, executor.map(run, slices)):
+            if rows_file is None:
+                failed.append((start, end, stats))
+                continue
+            if not from_cache:
+                queried += 1
+                bytes_scanned += stats.get('BytesScanned', 0)
+                print(f"{start.strftime(TIME_FORMAT)} - {end.strftime(TIME_FORMAT)}: "
+                      f"{stats.get('EventsMatched', 0)} of {stats.get('EventsScanned', 0)} events matched, "
+                      f"{stats.get('BytesScanned', 0) / 2**20:.1f} MiB scanned in {stats.get('ExecutionTimeInMillis', 0) / 1000:.1f} s")
+            with open(rows_file) as f:
+                for line in f:
+                    record = json.loads(line)
+                    total += 1
+                    # The query already excludes authorized accounts; this set lookup is a safety net
+                    recipient = record.get('RecipientAccountID')
+                    if recipient is None or recipient in authorized:
+                        continue
+                    # Events at the window boundary may have been reported by the previous run
+                    event_id = record.get('eventID')
+                    if seen and event_id in seen:
+                        duplicates += 1
+                        continue
+                    rj.write(line)
+                    writer.writerow([record.get(column) for column in COLUMNS])
+                    reported += 1
+                    written[event_id] = record.get('eventTime')
+            if rows_file.suffix == '.tmp':
+                rows_file.unlink()
+
+    print(f"{len(slices)} time slices of {slice_hours} h: {queried} queried "
+          f"({bytes_scanned / 2**20:.1f} MiB scanned), {len(slices) - queried - len(failed)} from the cache in {slice_cache}")
+    print(f"{total} S3 write events returned; {reported} to unauthorized accounts written to {csv_path}"
+          + (f" ({duplicates} already reported skipped)" if duplicates else ""))
+    if failed:
+        print(f"\n{len(failed)} time slices failed and are missing from the results (re-run to retry them):")
+        for start, end, error in failed:
+            print(f"  {start.strftime(TIME_FORMAT)} - {end.strftime(TIME_FORMAT)}: {error}")
+    return written, (failed[0][0] if failed else None)
+
+
+def load_state(path):
+    """The incremental watermark; the first run starts at event_time_filter."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'watermark': event_time_filter, 'lastEventTime': None, 'seenEventIDs': {}}
+
+
+def save_state(path, state):
+    tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def incremental_run(path):
+    """
+    Query only the events since the watermark (the end of the last queried window),
+    minus incremental_lookback_minutes for events CloudTrail delivers late, and append
+    them to today's output files. Events already reported in the lookback window are
+    recognized by eventID and skipped. Returns False if a time slice failed.
+    """
+    state = load_state(path)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    lookback = timedelta(minutes=incremental_lookback_minutes)
+    watermark = datetime.strptime(state['watermark'], TIME_FORMAT).replace(tzinfo=timezone.utc)
+    day = now.strftime('%Y-%m-%d')
+    written, failed_at = audit(
+        watermark - lookback, now,
+        script_dir / f'{PurePath(accounts).stem}_s3audit_{day}.jsonl',
+        script_dir / f'{PurePath(accounts).stem}_s3audit_{day}.csv',
+        append=True, use_cache=False, seen=state['seenEventIDs']
+    )
+
+    # Advance the watermark only up to the first failed slice, so it is queried again next run
+    new_watermark = max(watermark, failed_at) if failed_at else now
+    cutoff = (new_watermark - lookback).strftime(TIME_FORMAT)
+    seen = {**state['seenEventIDs'], **written}
+    event_times = [t for t in [state['lastEventTime']] + list(written.values()) if t]
+    save_state(path, {
+        'watermark': new_watermark.strftime(TIME_FORMAT),
+        'lastEventTime': max(event_times) if event_times else None,
+        # eventIDs that the next run's lookback window will return again
+        'seenEventIDs': {event_id: t for event_id, t in seen.items() if t >= cutoff},
+    })
+    print(f"Watermark: {new_watermark.strftime(TIME_FORMAT)} (state: {path})")
+    return failed_at is None
+
+
+if args.incremental:
+    # Run once (cron), or every --interval minutes (daemon)
+    while True:
+        ok = incremental_run(state_file)
+        if not args.interval:
+            exit(0 if ok else 1)
+        time.sleep(args.interval * 60)
+
+# One-shot audit of everything since event_time_filter
+now = datetime.now(timezone.utc).replace(microsecond=0)
+window_start = datetime.strptime(event_time_filter, TIME_FORMAT).replace(tzinfo=timezone.utc)
+_, failed_at = audit(window_start, now, results_json, results_csv)
+if failed_at:
+    exit(1)
@@ -0,0 +1,155 @@
+"""
+Shared boto3 client factory for the utils scripts.
+
+Clients are cached per (service, region, profile, role) and built with a
+tuned botocore config: a connection pool sized to the caller's worker count,
+TCP keepalive, and configurable retry mode and timeouts. boto3 clients are
+thread-safe, so one client per key is shared by all worker threads.
+
+Clients for other accounts use an assumed-role session (get_role_session)
+whose credentials are refreshed automatically before they expire.
+
+Scripts live in subfolders and are run directly, so they put this folder on
+sys.path before importing:
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from aws_clients import get_client
+"""
+import os
+import threading
+
+import boto3
+import botocore.session
+from botocore.config import Config
+from botocore.credentials import RefreshableCredentials
+
+# Defaults for new clients; override with configure()
+SETTINGS = {
+    'max_pool_connections': 10,
+    'retries_mode': os.environ.get('AWS_RETRY_MODE', 'standard'),
+    'max_attempts': int(os.environ.get('AWS_MAX_ATTEMPTS', 5)),
+    'connect_timeout': 10,
+    'read_timeout': 60,
+}
+
+_lock = threading.Lock()
+_sessions = {}
+# (account, role_name, profile) -> assumed-role session
+_role_sessions = {}
+# (service, region, profile, role_arn, max_attempts) -> (max_pool_connections, client)
+_clients = {}
+
+ROLE_SESSION_NAME = 'aws-utils'
+
+
+def configure(**settings) -> None:
+    """
+    Change the defaults used for new clients and drop cached clients.
+
+    Accepts any SETTINGS key: max_pool_connections, retries_mode ('legacy',
+    'standard' or 'adaptive'), max_attempts, connect_timeout, read_timeout.
+    """
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown client settings: {', '.join(sorted(unknown))}")
+    with _lock:
+        SETTINGS.update(settings)
+        _clients.clear()
+
+
+def client_config(max_pool_connections: int = None, max_attempts: int = None) -> Config:
+    """Build the botocore Config used for every client."""
+    return Config(
+        max_pool_connections=max(max_pool_connections or 0, SETTINGS['max_pool_connections']),
+        tcp_keepalive=True,
+        retries={'mode': SETTINGS['retries_mode'], 'max_attempts': max_attempts or SETTINGS['max_attempts']},
+        connect_timeout=SETTINGS['connect_timeout'],
+        read_timeout=SETTINGS['read_timeout'],
+    )
+
+
+def get_session(profile: str = None) -> boto3.session.Session:
+    """Return a cached boto3 session for a named profile (None = default chain)."""
+    with _lock:
+        if profile not in _sessions:
+            _sessions[profile] = boto3.session.Session(profile_name=profile)
+        return _sessions[profile]
+
+
+def role_arn(account: str, role_name: str) -> str:
+    return f'arn:aws:iam::{account}:role/{role_name}'
+
+
+def get_role_session(account: str, role_name: str, profile: str = None) -> boto3.session.Session:
+    """
+    Return a cached session that assumes role_name in account.
+
+    The role is assumed with the credentials of `profile` (None = default
+    chain), and the session refreshes them before they expire, so long
+    scans are not cut off by the one-hour STS limit.
+    """
+    key = (account, role_name, profile)
+    with _lock:
+        if key in _role_sessions:
+            return _role_sessions[key]
+
+    sts = get_client('sts', profile=profile)
+    arn = role_arn(account, role_name)
+
+    def refresh():
+        creds = sts.assume_role(RoleArn=arn, RoleSessionName=ROLE_SESSION_NAME)['Credentials']
+        return {
+            'access_key': creds['AccessKeyId'],
+            'secret_key': creds['SecretAccessKey'],
+            'token': creds['SessionToken'],
+            'expiry_time': creds['Expiration'].isoformat(),
+        }
+
+    credentials = RefreshableCredentials.create_from_metadata(
+        metadata=refresh(), refresh_using=refresh, method='sts-assume-role'
+    )
+    core_session = botocore.session.get_session()
+    core_session._credentials = credentials
+    if profile:
+        core_session.set_config_variable('profile', profile)
+    session = boto3.session.Session(botocore_session=core_session)
+
+    with _lock:
+        return _role_sessions.setdefault(key, session)
+
+
+def get_client(
+    service: str,
+    region: str = None,
+    profile: str = None,
+    max_pool_connections: int = None,
+    account: str = None,
+    role_name: str = None,
+    max_attempts: int = None
+):
+    """
+    Return a shared client for (service, region, profile[, account role]).
+
+    A cached client is reused as long as its connection pool is at least
+    max_pool_connections; otherwise it is replaced by one with a larger pool.
+    Callers should pass their worker count so threads never queue for a
+    connection. With account and role_name the client uses an assumed-role
+    session in that account. max_attempts overrides the botocore retry
+    budget; callers that retry themselves (s3_throttle.call_with_backoff)
+    pass 1 so every throttle reaches their limiter.
+    """
+    if account and role_name:
+        session = get_role_session(account, role_name, profile)
+        key = (service, region, profile, role_arn(account, role_name), max_attempts)
+    else:
+        session = get_session(profile)
+        key = (service, region, profile, None, max_attempts)
+    with _lock:
+        pool_size = max(max_pool_connections or 0, SETTINGS['max_pool_connections'])
+        cached = _clients.get(key)
+        if cached and cached[0] >= pool_size:
+            return cached[1]
+        # Session.client() is not thread-safe, so build under the lock
+        client = session.client(service, region_name=region, config=client_config(pool_size, max_attempts))
+        _clients[key] = (pool_size, client)
+        return client
@@ -0,0 +1,203 @@
+"""
+Multi-account, multi-region fan-out for the inventory scripts.
+
+A scan is a function taking (client, target) and returning (or yielding)
+the row dicts for one account and region. fanout() runs it for every
+(account, region) target concurrently in a bounded thread pool, assuming a
+role in each account, and merges the rows into one report with Account and
+Region columns. A failing target (missing role, disabled region, throttling
+that outlasts the retries, ...) is reported and skipped; it never aborts the
+other targets, and none of its rows reach the report.
+
+For large inventories pass a CsvReport: each target's rows are spooled to
+a temporary file as the scan yields them and appended to the report only
+once the scan has succeeded, so rows are never all held in memory.
+
+Scripts add the standard flags with add_fanout_arguments() and call
+fanout_enabled(args) to decide whether to fan out or run their usual
+single-target scan:
+
+    --accounts 111111111111,222222222222   (or a file, one account per line)
+    --regions us-east-1,us-west-2          (or 'all' for every enabled region)
+    --role-name OrganizationAccountAccessRole
+    --fanout-workers 16
+"""
+import csv
+import shutil
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from aws_clients import get_client
+
+DEFAULT_ROLE_NAME = 'OrganizationAccountAccessRole'
+DEFAULT_WORKERS = 16
+
+# account/region None = the caller's own credentials / default region
+Target = namedtuple('Target', ['account', 'region'])
+
+
+def parse_list(value: str) -> list:
+    """Split a comma-separated value, or read a file with one item per line."""
+    if not value:
+        return []
+    path = Path(value)
+    if path.is_file():
+        lines = path.read_text().splitlines()
+    else:
+        lines = value.split(',')
+    items = [line.split('#', 1)[0].strip() for line in lines]
+    return [item for item in items if item]
+
+
+def current_account(profile: str = None) -> str:
+    """Account ID of the calling credentials."""
+    return get_client('sts', profile=profile).get_caller_identity()['Account']
+
+
+def enabled_regions(profile: str = None) -> list:
+    """Regions enabled for the calling account."""
+    ec2 = get_client('ec2', profile=profile)
+    regions = ec2.describe_regions(AllRegions=False)['Regions']
+    return sorted(r['RegionName'] for r in regions)
+
+
+def build_targets(accounts: list = None, regions: list = None, profile: str = None) -> list:
+    """Every (account, region) pair; 'all' expands to the enabled regions."""
+    if regions == ['all']:
+        regions = enabled_regions(profile=profile)
+    return [Target(account, region) for account in (accounts or [None]) for region in (regions or [None])]
+
+
+class CsvReport:
+    """
+    One CSV report filled by concurrent target scans.
+
+    write_target() spools a target's rows to a temporary file as they are
+    produced and appends them to the report under a lock once they are all
+    written. A scan that raises part-way leaves nothing in the report.
+    """
+
+    def __init__(self, path: str, fieldnames: list):
+        self.fieldnames = fieldnames
+        self.count = 0
+        self._file = open(path, 'w', newline='')
+        csv.DictWriter(self._file, fieldnames=fieldnames).writeheader()
+        self._lock = threading.Lock()
+
+    def write_target(self, rows) -> int:
+        """Append all of one target's rows (any iterable), or none of them if it raises."""
+        with tempfile.TemporaryFile('w+', newline='') as spool:
+            writer = csv.DictWriter(spool, fieldnames=self.fieldnames)
+            count = 0
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+            spool.seek(0)
+            with self._lock:
+                shutil.copyfileobj(spool, self._file)
+                self.count += count
+        return count
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def fanout(
+    scan,
+    targets: list,
+    service: str = 'ec2',
+    role_name: str = DEFAULT_ROLE_NAME,
+    max_workers: int = DEFAULT_WORKERS,
+    profile: str = None,
+    report: CsvReport = None
+) -> tuple:
+    """
+    Run scan(client, target) for every target concurrently.
+
+    Args:
+        scan: Function returning or yielding the row dicts for one target
+        targets: Targets from build_targets()
+        service: Service of the client passed to scan
+        role_name: Role assumed in each target account
+        max_workers: Maximum targets scanned at the same time
+        profile: Profile used to call STS (None = default chain)
+        report: Optional CsvReport to stream rows into instead of returning them
+
+    Returns:
+        (rows, failures): rows carry leading Account and Region columns and
+        are ordered by target (empty with a report, whose rows are in
+        target completion order); failures is a list of (target, error
+        message). A failed target contributes no rows either way.
+    """
+    own_account = None
+    if any(t.account is None for t in targets):
+        own_account = current_account(profile)
+
+    def run(target):
+        client = get_client(
+            service,
+            region=target.region,
+            profile=profile,
+            account=target.account,
+            role_name=role_name if target.account else None
+        )
+        account = target.account or own_account
+        region = target.region or client.meta.region_name
+        rows = ({'Account': account, 'Region': region, **row} for row in scan(client, target))
+        if report:
+            report.write_target(rows)
+            return []
+        return list(rows)
+
+    results = {}
+    failures = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets)))) as executor:
+        futures = {executor.submit(run, target): target for target in targets}
+        for future in as_completed(futures):
+            target = futures[future]
+            try:
+                results[target] = future.result()
+            except Exception as e:
+                failures.append((target, f'{type(e).__name__}: {e}'))
+
+    rows = [row for target in targets for row in results.get(target, [])]
+    failures.sort(key=lambda failure: targets.index(failure[0]))
+    return rows, failures
+
+
+def add_fanout_arguments(parser) -> None:
+    """Add the standard --accounts/--regions/--role-name/--fanout-workers flags."""
+    group = parser.add_argument_group('multi-account / multi-region')
+    group.add_argument('--accounts',
+                       help='Comma-separated account IDs, or a file with one per line; '
+                            'each account is scanned by assuming --role-name')
+    group.add_argument('--regions',
+                       help="Comma-separated regions, or 'all' for every enabled region")
+    group.add_argument('--role-name', default=DEFAULT_ROLE_NAME,
+                       help=f'Role assumed in each account (default: {DEFAULT_ROLE_NAME})')
+    group.add_argument('--fanout-workers', type=int, default=DEFAULT_WORKERS,
+                       help=f'Accounts/regions scanned concurrently (default: {DEFAULT_WORKERS})')
+
+
+def fanout_enabled(args) -> bool:
+    return bool(args.accounts or args.regions)
+
+
+def fanout_from_args(scan, args, service: str = 'ec2', report: CsvReport = None) -> tuple:
+    """fanout() over the targets selected by the standard flags."""
+    targets = build_targets(parse_list(args.accounts), parse_list(args.regions))
+    return fanout(
+        scan, targets, service=service, role_name=args.role_name, max_workers=args.fanout_workers, report=report
+    )
+
+
+def print_failures(failures: list) -> None:
+    """Summarize the targets that could not be scanned."""
+    if not failures:
+        return
+    print(f"\n⚠️ {len(failures)} account/region targets failed and are missing from the report:")
+    for target, error in failures:
+        print(f"  {target.account or 'current'}/{target.region or 'default'}: {error}")
@@ -1,70 +1,221 @@
 #!/usr/bin/env python3
-import boto3
+import argparse
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from datetime import datetime, timezone, timedelta
+from botocore.exceptions import ClientError
+
+# Shared helpers (aws_clients) live in the parent utils/ folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from aws_clients import get_client
+from ebs_snapshots import lookup_snapshots
 
 # ===== CONFIGURATION =====
 GRACE_PERIOD_DAYS = 7   # Only delete unattached volumes older than this
 PROTECTED_TAG = "DoNotDelete"
 REGION = "us-west-2"    # Or set via AWS_REGION env var
+MAX_CONCURRENT_SNAPSHOTS = 20   # Pending snapshots at once; keep below the account's limit
+POLL_INTERVAL_SECONDS = 15      # Delay between batched snapshot status checks
+DELETE_WORKERS = 8              # Concurrent delete_volume calls
+SNAPSHOT_TIMEOUT_SECONDS = 600  # Keep a volume if its snapshot has not completed by then
+MAX_LOOKUP_FAILURES = 5         # Keep a volume if its snapshot status cannot be read this many times in a row
 # =========================
 
-ec2 = boto3.client("ec2", region_name=REGION)
 
-def main():
-    cutoff_time = datetime.now(timezone.utc) - timedelta(days=GRACE_PERIOD_DAYS)
+def find_candidate_volumes(ec2, grace_days, protected_tag):
+    """Unattached volumes older than the grace period and not protected by a tag."""
+    cutoff_time = datetime.now(timezone.utc) - timedelta(days=grace_days)
+    candidates = []
 
     # Find unattached (available) volumes
-    volumes = ec2.describe_volumes(
-        Filters=[{"Name": "status", "Values": ["available"]}]
-    )["Volumes"]
+    paginator = ec2.get_paginator("describe_volumes")
+    for page in paginator.paginate(Filters=[{"Name": "status", "Values": ["available"]}]):
+        for vol in page["Volumes"]:
+            vol_id = vol["VolumeId"]
+            create_time = vol["CreateTime"]
+
+            # Skip recent volumes within grace period
+            if create_time > cutoff_time:
+                print(f"Skipping {vol_id} (created {create_time}, within grace period).")
+                continue
+
+            # Check tags
+            tags = {t["Key"]: t["Value"] for t in vol.get("Tags", [])}
+            if tags.get(protected_tag, "").lower() == "true":
+                print(f"Skipping {vol_id} (tagged {protected_tag}).")
+                continue
+
+            candidates.append(vol_id)
+    return candidates
+
+
+def start_snapshot(ec2, vol_id):
+    """Start a snapshot of a volume, tagged with its source volume at creation."""
+    desc = (
+        f"Auto-snapshot before deletion of {vol_id} "
+        f"({datetime.now(timezone.utc).isoformat()})"
+    )
+    snap = ec2.create_snapshot(
+        VolumeId=vol_id,
+        Description=desc,
+        TagSpecifications=[{
+            "ResourceType": "snapshot",
+            "Tags": [{"Key": "SourceVolume", "Value": vol_id}]
+        }]
+    )
+    return snap["SnapshotId"]
+
+
+def delete_volume(ec2, vol_id, snap_id):
+    ec2.delete_volume(VolumeId=vol_id)
+    print(f"Deleted unattached volume {vol_id} (snapshot {snap_id}).")
+
+
+def snapshot_and_delete(
+    ec2,
+    volume_ids,
+    max_concurrent_snapshots=MAX_CONCURRENT_SNAPSHOTS,
+    poll_interval=POLL_INTERVAL_SECONDS,
+    delete_workers=DELETE_WORKERS,
+    snapshot_timeout=SNAPSHOT_TIMEOUT_SECONDS
+):
+    """
+    Snapshot and delete volumes as a pipeline.
+
+    Up to max_concurrent_snapshots snapshots are pending at once. All pending
+    snapshots are polled together with batched describe_snapshots calls, and
+    each volume is deleted (concurrently) as soon as its own snapshot
+    completes, while new snapshots are started in the freed slots.
+    A volume is kept, and reported as an error, when its snapshot has not
+    completed within snapshot_timeout seconds or its status could not be
+    read MAX_LOOKUP_FAILURES polls in a row.
+    Returns (deleted volume IDs, {volume ID: error}).
+    """
+    queue = deque(volume_ids)
+    pending = {}  # snapshot ID -> volume ID
+    deadlines = {}  # snapshot ID -> time by which it must complete
+    lookup_failures = {}  # snapshot ID -> consecutive failed status reads
+    deleted = []
+    errors = {}
+    limit = max_concurrent_snapshots
 
-    if not volumes:
+    with ThreadPoolExecutor(max_workers=delete_workers) as executor:
+        deletions = {}
+
+        while queue or pending:
+            # Fill free snapshot slots
+            while queue and len(pending) < limit:
+                vol_id = queue.popleft()
+                try:
+                    snap_id = start_snapshot(ec2, vol_id)
+                except ClientError as e:
+                    code = e.response.get("Error", {}).get("Code", "")
+                    if "LimitExceeded" in code and pending:
+                        # Account snapshot limit reached: wait for pending ones to finish
+                        queue.appendleft(vol_id)
+                        limit = len(pending)
+                        print(f"Snapshot limit reached ({code}); continuing with {limit} concurrent snapshots.")
+                        break
+                    errors[vol_id] = f"create_snapshot: {e}"
+                    print(f"ERROR: Could not snapshot {vol_id} → {e}", file=sys.stderr)
+                    continue
+                pending[snap_id] = vol_id
+                deadlines[snap_id] = time.monotonic() + snapshot_timeout
+                print(f"Snapshot {snap_id} creation started for {vol_id}.")
+
+            if not pending:
+                continue
+
+            time.sleep(poll_interval)
+            snapshots, failed_lookups = lookup_snapshots(ec2, list(pending), owner_ids=["self"])
+            for snap_id, vol_id in list(pending.items()):
+                snap = snapshots.get(snap_id)
+                if snap_id in failed_lookups:
+                    lookup_failures[snap_id] = lookup_failures.get(snap_id, 0) + 1
+                else:
+                    lookup_failures.pop(snap_id, None)
+                if snap is None or snap["State"] == "pending":
+                    # Not visible yet (eventual consistency), still running, or the lookup failed
+                    if lookup_failures.get(snap_id, 0) >= MAX_LOOKUP_FAILURES:
+                        reason = f"status of snapshot {snap_id} could not be read {MAX_LOOKUP_FAILURES} times in a row"
+                    elif time.monotonic() > deadlines[snap_id]:
+                        reason = f"snapshot {snap_id} did not complete within {snapshot_timeout:g} seconds"
+                    else:
+                        continue
+                    del pending[snap_id]
+                    errors[vol_id] = reason
+                    print(f"ERROR: {reason}; volume {vol_id} kept.", file=sys.stderr)
+                    continue
+                state = snap["State"]
+                if state == "completed":
+                    del pending[snap_id]
+                    # Probe back up towards the configured limit after a reduction
+                    limit = min(max_concurrent_snapshots, limit + 1)
+                    print(f"Snapshot {snap_id} completed.")
+                    deletions[executor.submit(delete_volume, ec2, vol_id, snap_id)] = vol_id
+                elif state == "error":
+                    del pending[snap_id]
+                    errors[vol_id] = f"snapshot {snap_id} ended in state {state}"
+                    print(f"ERROR: Snapshot {snap_id} for {vol_id} failed ({state}); volume kept.",
+                          file=sys.stderr)
+
+        for future, vol_id in deletions.items():
+            try:
+                future.result()
+                deleted.append(vol_id)
+            except Exception as e:
+                errors[vol_id] = f"delete_volume: {e}"
+                print(f"ERROR: Could not delete {vol_id} → {e}", file=sys.stderr)
+
+    return deleted, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Snapshot and delete unattached EBS volumes, many volumes at a time."
+    )
+    parser.add_argument("--region", default=REGION,
+                        help=f"AWS region (default: {REGION})")
+    parser.add_argument("--grace-days", type=int, default=GRACE_PERIOD_DAYS,
+                        help=f"Only delete volumes older than this many days (default: {GRACE_PERIOD_DAYS})")
+    parser.add_argument("--protected-tag", default=PROTECTED_TAG,
+                        help=f"Tag key to skip deletion (value must be 'true', default: {PROTECTED_TAG})")
+    parser.add_argument("--max-concurrent-snapshots", type=int, default=MAX_CONCURRENT_SNAPSHOTS,
+                        help=f"Snapshots pending at the same time (default: {MAX_CONCURRENT_SNAPSHOTS})")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL_SECONDS,
+                        help=f"Seconds between snapshot status checks (default: {POLL_INTERVAL_SECONDS})")
+    parser.add_argument("--delete-workers", type=int, default=DELETE_WORKERS,
+                        help=f"Concurrent volume deletions (default: {DELETE_WORKERS})")
+    parser.add_argument("--snapshot-timeout", type=float, default=SNAPSHOT_TIMEOUT_SECONDS,
+                        help=f"Keep a volume if its snapshot has not completed after this many seconds "
+                             f"(default: {SNAPSHOT_TIMEOUT_SECONDS})")
+    args = parser.parse_args()
+
+    ec2 = get_client("ec2", region=args.region, max_pool_connections=args.delete_workers + 2)
+    volume_ids = find_candidate_volumes(ec2, args.grace_days, args.protected_tag)
+    if not volume_ids:
         print("No unattached volumes found.")
         return
 
-    for vol in volumes:
-        vol_id = vol["VolumeId"]
-        create_time = vol["CreateTime"]
-
-        # Skip recent volumes within grace period
-        if create_time > cutoff_time:
-            print(f"Skipping {vol_id} (created {create_time}, within grace period).")
-            continue
-
-        # Check tags
-        tags = {t["Key"]: t["Value"] for t in vol.get("Tags", [])}
-        if tags.get(PROTECTED_TAG, "").lower() == "true":
-            print(f"Skipping {vol_id} (tagged {PROTECTED_TAG}).")
-            continue
-
-        # Create snapshot
-        desc = (
-            f"Auto-snapshot before deletion of {vol_id} "
-            f"({datetime.now(timezone.utc).isoformat()})"
-        )
-        try:
-            snap = ec2.create_snapshot(VolumeId=vol_id, Description=desc)
-            snap_id = snap["SnapshotId"]
-            print(f"Snapshot {snap_id} creation started for {vol_id}.")
-
-            # Wait for snapshot to complete
-            waiter = ec2.get_waiter("snapshot_completed")
-            print(f"Waiting for snapshot {snap_id} to complete...")
-            waiter.wait(SnapshotIds=[snap_id])
-            print(f"Snapshot {snap_id} completed.")
-
-            # Tag snapshot for traceability
-            ec2.create_tags(
-                Resources=[snap_id],
-                Tags=[{"Key": "SourceVolume", "Value": vol_id}]
-            )
-
-            # Delete volume after snapshot is confirmed complete
-            ec2.delete_volume(VolumeId=vol_id)
-            print(f"Deleted unattached volume {vol_id}.")
-
-        except Exception as e:
-            print(f"ERROR: Could not snapshot/delete {vol_id} → {e}", file=sys.stderr)
+    print(f"Snapshotting and deleting {len(volume_ids)} unattached volumes...")
+    deleted, errors = snapshot_and_delete(
+        ec2,
+        volume_ids,
+        max_concurrent_snapshots=args.max_concurrent_snapshots,
+        poll_interval=args.poll_interval,
+        delete_workers=args.delete_workers,
+        snapshot_timeout=args.snapshot_timeout
+    )
+
+    print(f"\nDeleted {len(deleted)} of {len(volume_ids)} volumes.")
+    if errors:
+        print(f"{len(errors)} volumes were kept because of errors:")
+        for vol_id, error in errors.items():
+            print(f"  {vol_id}: {error}")
+
 
 if __name__ == "__main__":
     main()
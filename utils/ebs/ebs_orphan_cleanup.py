@@ -1,33 +1,38 @@
 #!/usr/bin/env python3
-import boto3
 import argparse
 import csv
+import re
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
 from datetime import datetime, timezone, timedelta
 from tabulate import tabulate
+from botocore.exceptions import ClientError
 
-def list_unattached_volumes(grace_days: int, protected_tag: str) -> list[dict]:
+# Shared helpers (aws_clients) live in the parent utils/ folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from aws_clients import get_client
+from aws_fanout import add_fanout_arguments, fanout_enabled, fanout_from_args, print_failures
+from ebs_snapshots import lookup_snapshots
+
+def list_unattached_volumes(grace_days: int, protected_tag: str, ec2=None) -> list[dict]:
     """
     List unattached EBS volumes that are older than the grace period,
     not protected by a tag, and classify into patterns.
     """
-    ec2 = boto3.client("ec2")
+    ec2 = ec2 or get_client("ec2")
     cutoff_time = datetime.now(timezone.utc) - timedelta(days=grace_days)
 
     paginator = ec2.get_paginator("describe_volumes")
     page_iterator = paginator.paginate(Filters=[{"Name": "status", "Values": ["available"]}])
 
-    results = []
+    # Collect candidates first so source snapshots can be resolved in batches
+    candidates = []
     for page in page_iterator:
         for vol in page["Volumes"]:
-            vol_id = vol["VolumeId"]
-            size = vol["Size"]
-            az = vol["AvailabilityZone"]
-            created = vol["CreateTime"]
-            attachments = vol.get("Attachments", [])
-            last_instance = attachments[-1]["InstanceId"] if attachments else None
-
             # Skip volumes within grace period
-            if created > cutoff_time:
+            if vol["CreateTime"] > cutoff_time:
                 continue
 
             # Skip protected volumes
@@ -35,72 +40,151 @@ def list_unattached_volumes(grace_days: int, protected_tag: str) -> list[dict]:
             if tags.get(protected_tag, "").lower() == "true":
                 continue
 
-            # Source snapshot analysis
-            snapshot_id = vol.get("SnapshotId")
-            snapshot_exists = False
-            ami_copy_snapshot = False
-
-            if snapshot_id:
-                try:
-                    snap = ec2.describe_snapshots(SnapshotIds=[snapshot_id])["Snapshots"][0]
-                    snapshot_exists = True
-                    desc = snap.get("Description", "").lower()
-                    if "copied for" in desc and "ami" in desc:
-                        ami_copy_snapshot = True
-                except Exception:
-                    snapshot_exists = False
-
-            # Determine pattern
-            if not attachments and not snapshot_id:
-                pattern = "Pattern1"  # Never attached, no snapshot
-            elif not attachments and snapshot_exists and ami_copy_snapshot:
-                pattern = "Pattern2"  # Never attached, AMI copy snapshot
-            else:
-                pattern = "Other"
-
-            results.append({
-                "VolumeId": vol_id,
-                "Size_GB": size,
-                "AZ": az,
-                "CreateTime": created.isoformat(),
-                "LastInstance": last_instance or "None",
-                "SnapshotId": snapshot_id or "None",
-                "SnapshotExists": "Yes" if snapshot_exists else "No",
-                "Pattern": pattern
-            })
+            candidates.append(vol)
+
+    # Snapshots whose lookup failed are treated as missing, as before
+    snapshots, _ = lookup_snapshots(
+        ec2, [vol["SnapshotId"] for vol in candidates if vol.get("SnapshotId")]
+    )
+
+    results = []
+    for vol in candidates:
+        vol_id = vol["VolumeId"]
+        size = vol["Size"]
+        az = vol["AvailabilityZone"]
+        created = vol["CreateTime"]
+        attachments = vol.get("Attachments", [])
+        last_instance = attachments[-1]["InstanceId"] if attachments else None
+
+        # Source snapshot analysis
+        snapshot_id = vol.get("SnapshotId")
+        snapshot_exists = False
+        ami_copy_snapshot = False
+
+        snap = snapshots.get(snapshot_id) if snapshot_id else None
+        if snap:
+            snapshot_exists = True
+            desc = snap.get("Description", "").lower()
+            if "copied for" in desc and "ami" in desc:
+                ami_copy_snapshot = True
+
+        # Determine pattern
+        if not attachments and not snapshot_id:
+            pattern = "Pattern1"  # Never attached, no snapshot
+        elif not attachments and snapshot_exists and ami_copy_snapshot:
+            pattern = "Pattern2"  # Never attached, AMI copy snapshot
+        else:
+            pattern = "Other"
+
+        results.append({
+            "VolumeId": vol_id,
+            "Size_GB": size,
+            "AZ": az,
+            "CreateTime": created.isoformat(),
+            "LastInstance": last_instance or "None",
+            "SnapshotId": snapshot_id or "None",
+            "SnapshotExists": "Yes" if snapshot_exists else "No",
+            "Pattern": pattern
+        })
 
     # Sort newest first
     results.sort(key=lambda x: x["CreateTime"], reverse=True)
     return results
 
-def tag_volumes(volumes):
-    ec2 = boto3.client("ec2")
+TAG_BATCH_SIZE = 500  # CreateTags accepts up to 1000 resource IDs per call
+# Errors caused by individual volumes in a batch; anything else fails the whole run
+INVALID_VOLUME_CODES = ("InvalidVolume.NotFound", "InvalidVolumeID.Malformed", "InvalidID")
+VOLUME_ID_PATTERN = re.compile(r"vol-[0-9a-f]+")
+
+
+def tag_volumes(volumes, ec2=None, batch_size=TAG_BATCH_SIZE):
+    """
+    Tag Pattern1/Pattern2 volumes SafeToDelete. Volumes sharing the same tag
+    set are tagged with one create_tags call per batch. When a batch fails
+    because of invalid volumes, the volumes named in the error are left out
+    (or isolated by bisection) and the rest retried; other errors, such as
+    UnauthorizedOperation or throttling, are raised.
+    """
+    ec2 = ec2 or get_client("ec2")
     now = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    # Group volumes by their (identical) tag set
+    groups = defaultdict(list)
     for vol in volumes:
         if vol["Pattern"] in ["Pattern1", "Pattern2"]:
-            ec2.create_tags(
-                Resources=[vol["VolumeId"]],
-                Tags=[
-                    {"Key": "SafeToDelete", "Value": "True"},
-                    {"Key": "DeleteReason", "Value": vol["Pattern"]},
-                    {"Key": "DeleteMarkedOn", "Value": now},
-                ]
-            )
-            print(f"Tagged {vol['VolumeId']} as SafeToDelete ({vol['Pattern']})")
-
-def delete_tagged_volumes():
-    ec2 = boto3.client("ec2")
+            groups[vol["Pattern"]].append(vol["VolumeId"])
+
+    failed = {}
+    for pattern, vol_ids in groups.items():
+        tags = [
+            {"Key": "SafeToDelete", "Value": "True"},
+            {"Key": "DeleteReason", "Value": pattern},
+            {"Key": "DeleteMarkedOn", "Value": now},
+        ]
+        tagged = 0
+        batches = [vol_ids[i:i + batch_size] for i in range(0, len(vol_ids), batch_size)]
+        while batches:
+            batch = batches.pop()
+            try:
+                ec2.create_tags(Resources=batch, Tags=tags)
+                tagged += len(batch)
+            except ClientError as e:
+                error = e.response.get("Error", {})
+                if error.get("Code") not in INVALID_VOLUME_CODES:
+                    raise
+                # The error message names the offending volumes; drop them and retry
+                invalid = set(VOLUME_ID_PATTERN.findall(error.get("Message", ""))) & set(batch)
+                if len(batch) == 1:
+                    invalid = set(batch)
+                if invalid:
+                    for vol_id in invalid:
+                        failed[vol_id] = e
+                        print(f"ERROR: Could not tag {vol_id} → {e}", file=sys.stderr)
+                    remaining = [vol_id for vol_id in batch if vol_id not in invalid]
+                    if remaining:
+                        batches.append(remaining)
+                else:
+                    # Otherwise bisect to isolate the volumes that cannot be tagged
+                    middle = len(batch) // 2
+                    batches += [batch[:middle], batch[middle:]]
+        print(f"Tagged {tagged} volumes as SafeToDelete ({pattern})")
+
+    return failed
+
+def delete_tagged_volumes(ec2=None, workers=8):
+    """Delete volumes tagged SafeToDelete=True, several at a time."""
+    ec2 = ec2 or get_client("ec2")
     paginator = ec2.get_paginator("describe_volumes")
     page_iterator = paginator.paginate(
         Filters=[{"Name": "tag:SafeToDelete", "Values": ["True"]},
                  {"Name": "status", "Values": ["available"]}]
     )
 
-    for page in page_iterator:
-        for vol in page["Volumes"]:
-            vol_id = vol["VolumeId"]
-            print(f"Deleting volume {vol_id}...")
-            ec2.delete_volume(VolumeId=vol_id)
+    def delete(vol_id):
+        ec2.delete_volume(VolumeId=vol_id)
+        print(f"Deleted volume {vol_id}")
+
+    deleted = 0
+    errors = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Deletions start while later pages are still being listed
+        futures = {
+            executor.submit(delete, vol["VolumeId"]): vol["VolumeId"]
+            for page in page_iterator
+            for vol in page["Volumes"]
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+                deleted += 1
+            except Exception as e:
+                errors[futures[future]] = e
+                print(f"ERROR: Could not delete {futures[future]} → {e}", file=sys.stderr)
+
+    print(f"Deleted {deleted} tagged volumes.")
+    if errors:
+        print(f"{len(errors)} volumes could not be deleted.")
+    return deleted, errors
 
 def output_table(volumes):
     if not volumes:
@@ -151,11 +235,34 @@ def main():
                         help="Tag volumes safe to delete (Pattern1/Pattern2).")
     parser.add_argument("--delete-tagged", action="store_true",
                         help="Delete volumes previously tagged SafeToDelete=True.")
+    parser.add_argument("--delete-workers", type=int, default=8,
+                        help="Concurrent deletions with --delete-tagged (default: 8).")
+    add_fanout_arguments(parser)
 
     args = parser.parse_args()
 
+    if fanout_enabled(args):
+        def scan(ec2, target):
+            # Tagging and deletion run inside each account/region's own scan
+            if args.delete_tagged:
+                delete_tagged_volumes(ec2, args.delete_workers)
+                return []
+            target_volumes = list_unattached_volumes(args.grace_days, args.protected_tag, ec2=ec2)
+            if args.tag_only:
+                tag_volumes(target_volumes, ec2)
+            return target_volumes
+
+        volumes, failures = fanout_from_args(scan, args)
+        if not args.delete_tagged:
+            if args.output == "table":
+                output_table(volumes)
+            else:
+                output_csv(volumes, args.csv_file)
+        print_failures(failures)
+        return
+
     if args.delete_tagged:
-        delete_tagged_volumes()
+        delete_tagged_volumes(workers=args.delete_workers)
         return
 
     volumes = list_unattached_volumes(args.grace_days, args.protected_tag)
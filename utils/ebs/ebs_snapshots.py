@@ -0,0 +1,43 @@
+"""
+Batched snapshot lookups shared by the EBS scripts.
+
+describe_snapshots(SnapshotIds=[...]) fails the whole call when any ID no
+longer exists, so IDs are resolved with the snapshot-id filter instead,
+which simply omits missing snapshots. Up to 200 IDs (the filter value
+limit) are resolved per call.
+"""
+from botocore.exceptions import ClientError
+
+BATCH_SIZE = 200
+
+
+def lookup_snapshots(ec2, snapshot_ids, batch_size=BATCH_SIZE, owner_ids=None):
+    """
+    Resolve snapshot IDs with batched describe_snapshots calls. Pass
+    owner_ids=["self"] for the account's own snapshots to skip public and
+    shared ones on the service side.
+
+    Returns (found, failed): found maps each existing snapshot ID to its
+    description; failed is the set of IDs whose batch errored, whose
+    existence is therefore unknown. IDs in neither do not exist.
+    """
+    unique_ids = sorted(set(snapshot_ids))
+    found = {}
+    failed = set()
+    paginator = ec2.get_paginator("describe_snapshots")
+
+    for i in range(0, len(unique_ids), batch_size):
+        batch = unique_ids[i : i + batch_size]
+        try:
+            params = {"Filters": [{"Name": "snapshot-id", "Values": batch}]}
+            if owner_ids:
+                params["OwnerIds"] = owner_ids
+            pages = paginator.paginate(**params)
+            for page in pages:
+                for snap in page["Snapshots"]:
+                    found[snap["SnapshotId"]] = snap
+        except ClientError as e:
+            print(f"WARNING: describe_snapshots failed for {len(batch)} snapshots: {e}")
+            failed.update(batch)
+
+    return found, failed
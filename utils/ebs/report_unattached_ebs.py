@@ -1,32 +1,51 @@
-import boto3
 import argparse
 import csv
+import sys
+from pathlib import Path
 from datetime import datetime, timezone, timedelta
 from tabulate import tabulate
 
-def list_unattached_volumes(grace_days: int, protected_tag: str) -> list[dict]:
+# Shared helpers (aws_clients) live in the parent utils/ folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from aws_clients import get_client
+from aws_fanout import add_fanout_arguments, current_account, fanout_enabled, fanout_from_args, print_failures
+from ebs_snapshots import lookup_snapshots
+from inventory_store import InventoryStore, add_store_arguments, commit_and_report, fingerprint
+
+STORE_KIND = "ebs-unattached-volume"
+
+def volume_fingerprint(vol) -> str:
+    """Fingerprint of the raw fields of a volume, stored alongside its record."""
+    return fingerprint([
+        vol["Size"],
+        vol["CreateTime"],
+        [a.get("InstanceId") for a in vol.get("Attachments", [])],
+        vol.get("SnapshotId"),
+        sorted((t["Key"], t["Value"]) for t in vol.get("Tags", [])),
+    ])
+
+def list_unattached_volumes(grace_days: int, protected_tag: str, ec2=None, snapshot=None) -> list[dict]:
     """
     List unattached EBS volumes that are older than the grace period and not protected by a tag.
     Flags orphaned volumes, VM-Import snapshots, and AMI copy snapshots.
+    With snapshot (an InventoryScan), every record is also put into the scan so the caller can
+    commit it and get the changes since the last run. Records are never reused from the store:
+    whether a source snapshot still exists decides Orphaned, so it is looked up on every run
+    (in batches, see ebs_snapshots).
     """
-    ec2 = boto3.client("ec2")
+    ec2 = ec2 or get_client("ec2")
     cutoff_time = datetime.now(timezone.utc) - timedelta(days=grace_days)
 
     paginator = ec2.get_paginator("describe_volumes")
     pages = paginator.paginate(Filters=[{"Name": "status", "Values": ["available"]}])
 
+    # Collect candidates first so source snapshots can be resolved in batches
     results = []
+    candidates = []
     for page in pages:
         for vol in page["Volumes"]:
-            vol_id = vol["VolumeId"]
-            size = vol["Size"]
-            az = vol["AvailabilityZone"]
-            created = vol["CreateTime"]
-            attachments = vol.get("Attachments", [])
-            last_instance = attachments[-1]["InstanceId"] if attachments else None
-
             # Skip volumes within grace period
-            if created > cutoff_time:
+            if vol["CreateTime"] > cutoff_time:
                 continue
 
             # Skip volumes with protected tag
@@ -34,51 +53,60 @@ def list_unattached_volumes(grace_days: int, protected_tag: str) -> list[dict]:
             if tags.get(protected_tag, "").lower() == "true":
                 continue
 
-            # Snapshot checks
-            source_snap_id = vol.get("SnapshotId")
-            snap_exists = "N/A"
-            ami_copy = "No"
-
-            if source_snap_id:
-                try:
-                    snap = ec2.describe_snapshots(SnapshotIds=[source_snap_id])["Snapshots"][0]
-                    snap_exists = "Yes"
-                    desc = snap.get("Description", "").lower()
-
-                    # if "vm import" in desc or "import-ami" in desc:
-                    #     vm_import = "Yes"
-                    if "copied for destinationami" in desc:
-                        ami_copy = "Yes"
-
-                except ec2.exceptions.ClientError as e:
-                    if "InvalidSnapshot.NotFound" in str(e):
-                        snap_exists = "No"
-                    else:
-                        snap_exists = "Unknown"
-
-            # Determine if truly orphaned
-            orphaned =  ((last_instance is None and snap_exists == "No") or
-                (last_instance is None and snap_exists == "Yes" and ami_copy == "Yes"))
-            
-
-            results.append({
-                "VolumeId": vol_id,
-                "Size_GB": size,
-                "CreateTimeRaw": created,
-                "LastInstance": last_instance or "None",
-                "SourceSnapshotId": source_snap_id or "None",
-                "SnapshotExists": snap_exists,
-                "AMICopySnapshot": ami_copy,
-                "Orphaned": "Yes" if orphaned else "No"
-            })
-    
-    # Sort results by creation time
-    results.sort(key=lambda x: x["CreateTimeRaw"], reverse=True)  # sort descending by datetime
+            candidates.append(vol)
+
+    snapshots, failed_snapshots = lookup_snapshots(
+        ec2, [vol["SnapshotId"] for vol in candidates if vol.get("SnapshotId")]
+    )
+
+    for vol in candidates:
+        vol_id = vol["VolumeId"]
+        size = vol["Size"]
+        created = vol["CreateTime"]
+        attachments = vol.get("Attachments", [])
+        last_instance = attachments[-1]["InstanceId"] if attachments else None
+
+        # Snapshot checks
+        source_snap_id = vol.get("SnapshotId")
+        snap_exists = "N/A"
+        ami_copy = "No"
+
+        if source_snap_id:
+            snap = snapshots.get(source_snap_id)
+            if snap:
+                snap_exists = "Yes"
+                desc = snap.get("Description", "").lower()
+
+                # if "vm import" in desc or "import-ami" in desc:
+                #     vm_import = "Yes"
+                if "copied for destinationami" in desc:
+                    ami_copy = "Yes"
+            elif source_snap_id in failed_snapshots:
+                snap_exists = "Unknown"
+            else:
+                snap_exists = "No"
+
+        # Determine if truly orphaned
+        orphaned =  ((last_instance is None and snap_exists == "No") or
+            (last_instance is None and snap_exists == "Yes" and ami_copy == "Yes"))
+
+        record = {
+            "VolumeId": vol_id,
+            "Size_GB": size,
+            "LastInstance": last_instance or "None",
+            "SourceSnapshotId": source_snap_id or "None",
+            "SnapshotExists": snap_exists,
+            "AMICopySnapshot": ami_copy,
+            "Orphaned": "Yes" if orphaned else "No",
+            # ISO string for display/CSV (sorts like the datetime: all UTC)
+            "CreateTime": created.isoformat()
+        }
+        if snapshot is not None:
+            snapshot.put(vol_id, volume_fingerprint(vol), record)
+        results.append(record)
 
-    # Convert datetime back to ISO string for display/CSV
-    for r in results:
-        r["CreateTime"] = r["CreateTimeRaw"].isoformat()
-        del r["CreateTimeRaw"]
+    # Sort results by creation time
+    results.sort(key=lambda x: x["CreateTime"], reverse=True)  # sort descending by datetime
     return results
 
 
@@ -119,15 +147,41 @@ def main():
                         help="Output format: table (default) or csv.")
     parser.add_argument("--csv-file", type=str, default="unattached_volumes.csv",
                         help="CSV filename if --output csv is chosen.")
+    add_fanout_arguments(parser)
+    # Source snapshots are looked up on every run, so stored records are never reused
+    add_store_arguments(parser, refresh=False)
 
     args = parser.parse_args()
-
-    volumes = list_unattached_volumes(args.grace_days, args.protected_tag)
+    if args.diff_file and not args.store:
+        parser.error("--diff-file requires --store")
+
+    store = InventoryStore(args.store) if args.store else None
+    own_account = current_account() if store else None
+
+    def scan(ec2, target=None):
+        if not store:
+            return list_unattached_volumes(args.grace_days, args.protected_tag, ec2=ec2)
+        snapshot = store.begin(STORE_KIND, (target and target.account) or own_account, ec2.meta.region_name)
+        volumes = list_unattached_volumes(args.grace_days, args.protected_tag, ec2=ec2, snapshot=snapshot)
+        commit_and_report(snapshot, args.diff_file)
+        return volumes
+
+    failures = []
+    try:
+        if fanout_enabled(args):
+            # One merged report with Account/Region columns across all targets
+            volumes, failures = fanout_from_args(scan, args)
+        else:
+            volumes = scan(get_client("ec2"))
+    finally:
+        if store:
+            store.close()
 
     if args.output == "table":
         output_table(volumes)
     else:
         output_csv(volumes, args.csv_file)
+    print_failures(failures)
 
 if __name__ == "__main__":
     main()
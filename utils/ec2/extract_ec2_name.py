@@ -1,33 +1,54 @@
 ###############################################################################
 # Script to extract EC2 instance names from a list of instance IDs and save to CSV
-# Usage: python extract_ec2_name.py
+# Usage: python extract_ec2_name.py [--input FILE] [--output FILE] [--region REGION]
+#        [--cache-file FILE] [--cache-ttl-hours N] [--no-cache] [--workers N]
+#        [--accounts IDS|FILE] [--regions R1,R2|all] [--role-name ROLE]
 ###############################################################################
-import boto3
+import argparse
 import csv
+import sys
+from pathlib import Path
 
-def get_instance_names(instance_ids, region_name="us-west-2"):
+# Shared helpers (aws_clients) live in the parent utils/ folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from aws_fanout import add_fanout_arguments, enabled_regions, fanout_from_args, parse_list, print_failures
+from instance_name_resolver import DEFAULT_CACHE_FILE, DEFAULT_TTL_HOURS, InstanceNameResolver
+
+
+def get_instance_names(instance_ids, region_name="us-west-2", ec2=None):
     """
     Retrieve EC2 instance names (from the 'Name' tag) for given instance IDs.
     Returns a dict mapping instance_id -> instance_name (or None if no Name tag).
+    IDs that do not exist are left out instead of failing the lookup.
     """
-    ec2 = boto3.client("ec2", region_name=region_name)
-    names = {}
+    resolver = InstanceNameResolver(
+        regions=[region_name],
+        cache_file=None,
+        client_factory=(lambda region: ec2) if ec2 else None
+    )
+    return resolver.resolve(instance_ids)
 
-    # AWS describe_instances allows up to 1000 instance IDs per call
-    for i in range(0, len(instance_ids), 1000):
-        batch = instance_ids[i:i + 1000]
-        response = ec2.describe_instances(InstanceIds=batch)
-
-        for reservation in response.get("Reservations", []):
-            for instance in reservation.get("Instances", []):
-                instance_id = instance["InstanceId"]
-                name = None
-                for tag in instance.get("Tags", []):
-                    if tag["Key"] == "Name":
-                        name = tag["Value"]
-                        break
-                names[instance_id] = name
 
+def find_instance_names(ec2, instance_ids):
+    """
+    Like get_instance_names, but IDs that do not exist in this account and
+    region are skipped instead of failing the call. Used when fanning out,
+    where each ID only exists in one of the targets.
+    """
+    names = {}
+    paginator = ec2.get_paginator("describe_instances")
+    # The instance-id filter accepts up to 200 values and ignores unknown IDs
+    for i in range(0, len(instance_ids), 200):
+        batch = instance_ids[i:i + 200]
+        for page in paginator.paginate(Filters=[{"Name": "instance-id", "Values": batch}]):
+            for reservation in page.get("Reservations", []):
+                for instance in reservation.get("Instances", []):
+                    name = None
+                    for tag in instance.get("Tags", []):
+                        if tag["Key"] == "Name":
+                            name = tag["Value"]
+                            break
+                    names[instance["InstanceId"]] = name
     return names
 
 
@@ -38,7 +59,7 @@ def read_instance_ids(file_path):
 
 
 def write_to_csv(data, output_file):
-    """Write a dict of instance_id -> name to a CSV file"""
+    """Write a dict of instance_id -> name (None = no Name tag or not found) to a CSV file"""
     with open(output_file, "w", newline="") as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(["InstanceId", "Name"])
@@ -46,12 +67,64 @@ def write_to_csv(data, output_file):
             writer.writerow([instance_id, name])
 
 
+def write_rows_to_csv(rows, output_file):
+    """Write fanned-out rows (Account, Region, InstanceId, Name) to a CSV file"""
+    with open(output_file, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=["Account", "Region", "InstanceId", "Name"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
 if __name__ == "__main__":
-    file_path = "instance_ids.txt"      # Input file with instance IDs
-    output_file = "instance_names.csv"  # Output CSV file
+    parser = argparse.ArgumentParser(description="Look up EC2 instance Name tags for a list of instance IDs.")
+    parser.add_argument("--input", default="instance_ids.txt",
+                        help="Input file with one instance ID per line (default: instance_ids.txt)")
+    parser.add_argument("--output", default="instance_names.csv",
+                        help="Output CSV file (default: instance_names.csv)")
+    parser.add_argument("--region", default="us-west-2",
+                        help="First region to search (default: us-west-2); --regions adds more")
+    parser.add_argument("--cache-file", default=str(DEFAULT_CACHE_FILE),
+                        help=f"ID -> Name cache file (default: {DEFAULT_CACHE_FILE})")
+    parser.add_argument("--cache-ttl-hours", type=float, default=DEFAULT_TTL_HOURS,
+                        help=f"Re-resolve cached IDs older than this (default: {DEFAULT_TTL_HOURS})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not read or write the cache file")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="Concurrent describe_instances batches (default: 8)")
+    add_fanout_arguments(parser)
+    args = parser.parse_args()
 
-    instance_ids = read_instance_ids(file_path)
-    instance_names = get_instance_names(instance_ids)
-    write_to_csv(instance_names, output_file)
+    instance_ids = read_instance_ids(args.input)
+    if args.accounts:
+        # Each ID is searched for in every account/region; unmatched IDs are listed last
+        rows, failures = fanout_from_args(
+            lambda ec2, target: [
+                {"InstanceId": instance_id, "Name": name}
+                for instance_id, name in find_instance_names(ec2, instance_ids).items()
+            ],
+            args
+        )
+        found = {row["InstanceId"] for row in rows}
+        rows += [{"InstanceId": i, "Name": None} for i in instance_ids if i not in found]
+        write_rows_to_csv(rows, args.output)
+        print(f"Instance names saved to {args.output} ({len(instance_ids) - len(found)} not found)")
+        print_failures(failures)
+    else:
+        # IDs not found in --region are searched for in the --regions list
+        regions = parse_list(args.regions)
+        if regions == ["all"]:
+            regions = enabled_regions()
+        resolver = InstanceNameResolver(
+            regions=[args.region] + regions,
+            cache_file=None if args.no_cache else args.cache_file,
+            ttl_hours=args.cache_ttl_hours,
+            workers=args.workers
+        )
+        try:
+            found = resolver.resolve(instance_ids)
+        finally:
+            resolver.save()
+        write_to_csv({i: found.get(i) for i in instance_ids}, args.output)
 
-    print(f"Instance names saved to {output_file}")
+        missing = sum(1 for i in instance_ids if i not in found)
+        print(f"Instance names saved to {args.output} ({missing} not found, {resolver.api_calls} API calls)")
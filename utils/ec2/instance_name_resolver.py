@@ -0,0 +1,170 @@
+###############################################################################
+# Reusable EC2 instance ID -> Name tag resolver with a persistent TTL cache
+# Shared by the EC2 scripts; not a standalone script
+###############################################################################
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from botocore.exceptions import ClientError
+
+# Shared helpers (aws_clients) live in the parent utils/ folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from aws_clients import get_client
+
+DEFAULT_CACHE_FILE = Path.home() / ".cache" / "aws-utils" / "instance_names.json"
+DEFAULT_TTL_HOURS = 24
+BATCH_SIZE = 1000  # describe_instances accepts up to 1000 instance IDs
+INVALID_ID_CODES = ("InvalidInstanceID.NotFound", "InvalidInstanceID.Malformed")
+INSTANCE_ID_PATTERN = re.compile(r"i-[0-9a-f]+")
+
+
+def name_tag(instance):
+    for tag in instance.get("Tags", []):
+        if tag["Key"] == "Name":
+            return tag["Value"]
+    return None
+
+
+class InstanceNameResolver:
+    """
+    Resolve instance IDs to their Name tags across one or more regions.
+
+    - IDs are looked up in concurrent describe_instances batches of 1000.
+    - A batch that fails because some IDs are invalid or terminated has
+      those IDs removed (parsed from the error, or isolated by bisection)
+      and is retried, so one bad ID never fails the run.
+    - IDs not found in a region are searched for in the next one, so the
+      region does not need to be known; the region each ID was found in is
+      cached and tried first next time.
+    - Results, including IDs that were not found anywhere, are kept in a
+      JSON cache file for ttl_hours (cache_file=None disables it).
+    """
+
+    def __init__(
+        self,
+        regions=("us-west-2",),
+        cache_file=DEFAULT_CACHE_FILE,
+        ttl_hours=DEFAULT_TTL_HOURS,
+        workers=8,
+        client_factory=None
+    ):
+        self.regions = list(regions)
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.ttl = ttl_hours * 3600
+        self.workers = workers
+        self.api_calls = 0
+        self._client_factory = client_factory or (
+            lambda region: get_client("ec2", region=region, max_pool_connections=workers)
+        )
+        self._lock = threading.Lock()
+        self._cache = self._read() if self.cache_file else {}
+
+    def _read(self):
+        try:
+            with open(self.cache_file) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def resolve(self, instance_ids):
+        """
+        Return {instance ID: Name tag or None} for the IDs that exist.
+        IDs missing from the result were not found in any region.
+        """
+        now = time.time()
+        wanted = list(dict.fromkeys(instance_ids))
+        results = {}
+        unresolved = []
+        for instance_id in wanted:
+            entry = self._cache.get(instance_id)
+            if entry and now - entry["cached_at"] < self.ttl:
+                if entry["found"]:
+                    results[instance_id] = entry["name"]
+            else:
+                unresolved.append(instance_id)
+
+        # Try each ID's last known region first, then every configured region
+        found = {}
+        for region in self._search_order(unresolved):
+            remaining = [i for i in unresolved if i not in found]
+            if not remaining:
+                break
+            found.update(self._lookup_region(region, remaining))
+
+        with self._lock:
+            for instance_id in unresolved:
+                if instance_id in found:
+                    region, name = found[instance_id]
+                    self._cache[instance_id] = {"name": name, "region": region, "found": True, "cached_at": now}
+                    results[instance_id] = name
+                else:
+                    self._cache[instance_id] = {"name": None, "region": None, "found": False, "cached_at": now}
+        return results
+
+    def _search_order(self, instance_ids):
+        known = [self._cache[i]["region"] for i in instance_ids
+                 if self._cache.get(i, {}).get("region")]
+        return list(dict.fromkeys(known + self.regions))
+
+    def _lookup_region(self, region, instance_ids):
+        """{instance ID: (region, name)} for the IDs that exist in region."""
+        ec2 = self._client_factory(region)
+        batches = [instance_ids[i:i + BATCH_SIZE] for i in range(0, len(instance_ids), BATCH_SIZE)]
+        found = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for names in executor.map(lambda batch: self._lookup_batch(ec2, batch), batches):
+                found.update({instance_id: (region, name) for instance_id, name in names.items()})
+        return found
+
+    def _lookup_batch(self, ec2, batch):
+        """Names of the IDs in batch that exist, dropping invalid IDs."""
+        while batch:
+            try:
+                with self._lock:
+                    self.api_calls += 1
+                pages = ec2.get_paginator("describe_instances").paginate(InstanceIds=batch)
+                return {
+                    instance["InstanceId"]: name_tag(instance)
+                    for page in pages
+                    for reservation in page.get("Reservations", [])
+                    for instance in reservation.get("Instances", [])
+                }
+            except ClientError as e:
+                error = e.response.get("Error", {})
+                if error.get("Code") not in INVALID_ID_CODES:
+                    raise
+                if len(batch) == 1:
+                    return {}
+                # The error message lists the offending IDs; drop them and retry
+                invalid = set(INSTANCE_ID_PATTERN.findall(error.get("Message", ""))) & set(batch)
+                if invalid:
+                    batch = [i for i in batch if i not in invalid]
+                    continue
+                # Otherwise bisect to isolate them
+                middle = len(batch) // 2
+                return {**self._lookup_batch(ec2, batch[:middle]), **self._lookup_batch(ec2, batch[middle:])}
+        return {}
+
+    def save(self):
+        """Write the cache atomically, merging entries saved by other runs."""
+        if not self.cache_file:
+            return
+        with self._lock:
+            merged = self._read()
+            for instance_id, entry in self._cache.items():
+                if entry["cached_at"] >= merged.get(instance_id, {}).get("cached_at", 0):
+                    merged[instance_id] = entry
+            # Drop expired entries so the file does not grow forever
+            cutoff = time.time() - self.ttl
+            merged = {k: v for k, v in merged.items() if v["cached_at"] >= cutoff}
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_file.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "w") as f:
+                json.dump(merged, f)
+            os.replace(tmp, self.cache_file)
+            self._cache = merged
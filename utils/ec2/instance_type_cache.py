@@ -0,0 +1,121 @@
+###############################################################################
+# Persistent cache of EC2 instance-type metadata (vCPUs, memory)
+# Shared by the EC2 inventory scripts; not a standalone script
+###############################################################################
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_FILE = Path.home() / ".cache" / "aws-utils" / "instance_types.json"
+DEFAULT_TTL_HOURS = 24 * 7
+BATCH_SIZE = 100  # describe_instance_types accepts up to 100 types per call
+
+
+def type_info(info):
+    """The fields kept per instance type."""
+    return {
+        "vCPUs": info["VCpuInfo"]["DefaultVCpus"],
+        "MemoryMiB": info["MemoryInfo"]["SizeInMiB"],
+    }
+
+
+class InstanceTypeCache:
+    """
+    JSON file of instance-type metadata keyed by region and instance type.
+
+    Instance types almost never change, so entries are reused until they
+    are older than the TTL. Missing or expired entries are fetched with
+    batched describe_instance_types calls (the instance-type filter, so an
+    unknown type does not fail its batch). One cache object can be shared by
+    threads scanning different regions.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, ttl_hours=DEFAULT_TTL_HOURS):
+        self.path = Path(path)
+        self.ttl = ttl_hours * 3600
+        self.api_calls = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._warmed = set()
+        self._data = self._read()
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _fresh(self, entry):
+        return entry is not None and time.time() - entry.get("cached_at", 0) < self.ttl
+
+    def _store(self, region, info):
+        entry = type_info(info)
+        entry["cached_at"] = time.time()
+        with self._lock:
+            self._data.setdefault(region, {})[info["InstanceType"]] = entry
+            self._dirty = True
+
+    def get_many(self, ec2, instance_types):
+        """
+        Return {instance type: {"vCPUs", "MemoryMiB"}} for the client's
+        region, fetching only the types that are missing or expired.
+        """
+        region = ec2.meta.region_name
+        with self._lock:
+            cached = dict(self._data.get(region, {}))
+        missing = sorted(t for t in set(instance_types) if not self._fresh(cached.get(t)))
+
+        paginator = ec2.get_paginator("describe_instance_types")
+        for i in range(0, len(missing), BATCH_SIZE):
+            batch = missing[i:i + BATCH_SIZE]
+            self.api_calls += 1
+            for page in paginator.paginate(Filters=[{"Name": "instance-type", "Values": batch}]):
+                for info in page["InstanceTypes"]:
+                    self._store(region, info)
+
+        with self._lock:
+            region_data = self._data.get(region, {})
+            return {
+                t: {k: v for k, v in region_data[t].items() if k != "cached_at"}
+                for t in instance_types if t in region_data
+            }
+
+    def warm(self, ec2):
+        """
+        Load every instance type offered in the client's region, once per
+        region per run. Returns the number of types loaded.
+        """
+        region = ec2.meta.region_name
+        with self._lock:
+            if region in self._warmed:
+                return 0
+            self._warmed.add(region)
+        count = 0
+        for page in ec2.get_paginator("describe_instance_types").paginate():
+            self.api_calls += 1
+            for info in page["InstanceTypes"]:
+                self._store(region, info)
+                count += 1
+        return count
+
+    def save(self):
+        """Write the cache atomically, merging entries saved by other runs."""
+        with self._lock:
+            if not self._dirty:
+                return
+            merged = self._read()
+            for region, types in self._data.items():
+                merged_region = merged.setdefault(region, {})
+                for itype, entry in types.items():
+                    if entry.get("cached_at", 0) >= merged_region.get(itype, {}).get("cached_at", 0):
+                        merged_region[itype] = entry
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "w") as f:
+                json.dump(merged, f)
+            os.replace(tmp, self.path)
+            self._data = merged
+            self._dirty = False
@@ -1,116 +1,294 @@
 ###############################################################################
 # Script to list EC2 instances with details including vCPUs, Memory, and Disk
 # Optimized for large environments
-# Usage: python list_ec2_instances.py
+# Usage: python list_ec2_instances.py [--region REGION] [--output FILE] [--volume-scan]
+#        [--accounts IDS|FILE] [--regions R1,R2|all] [--role-name ROLE]
+#        [--store DB] [--diff-file FILE]
 ###############################################################################
-import boto3
+import argparse
 import csv
-from collections import defaultdict
+import sys
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
 
-def list_instances(region_name="us-east-1"):
+# Shared helpers (aws_clients) live in the parent utils/ folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from aws_clients import get_client
+from aws_fanout import CsvReport, add_fanout_arguments, current_account, fanout_enabled, fanout_from_args, print_failures
+from inventory_store import InventoryStore, add_store_arguments, commit_and_report, fingerprint
+from instance_type_cache import DEFAULT_CACHE_FILE, DEFAULT_TTL_HOURS, InstanceTypeCache
+
+# Output columns, in order
+FIELDNAMES = ["InstanceId", "Name", "PrivateIp", "InstanceType", "vCPUs", "MemoryMiB", "TotalDiskGiB"]
+
+VOLUME_BATCH_SIZE = 500  # describe_volumes accepts up to 500 volume IDs
+VOLUME_WORKERS = 8
+STORE_KIND = "ec2-instance"
+
+
+def list_instances(region_name="us-east-1", ec2=None, type_cache=None, **kwargs):
     """
     Retrieve EC2 instance details including:
     InstanceId, Name, PrivateIp, InstanceType, vCPUs, MemoryMiB, TotalDiskGiB
-    Optimized for large environments.
+    Returns a list; use iter_instances() to stream records page by page.
     """
-    ec2 = boto3.client("ec2", region_name=region_name)
-
-    instances = []
-    instance_type_cache = {}
-    volume_map = {}
-
-    # --- Step 1: Get all instances ---
-    paginator = ec2.get_paginator("describe_instances")
-    all_instances = []
-    for page in paginator.paginate():
-        for reservation in page.get("Reservations", []):
-            for instance in reservation.get("Instances", []):
-                all_instances.append(instance)
-
-    if not all_instances:
-        return []
-
-    # --- Step 2: Collect unique instance types and volume IDs ---
-    instance_types = set()
-    volume_ids = []
-    for instance in all_instances:
-        instance_types.add(instance["InstanceType"])
-        for bd in instance.get("BlockDeviceMappings", []):
-            if "Ebs" in bd:
-                volume_ids.append(bd["Ebs"]["VolumeId"])
-
-    # --- Step 3: Fetch instance type attributes in bulk ---
-    for itype in instance_types:
-        resp = ec2.describe_instance_types(InstanceTypes=[itype])
-        if resp["InstanceTypes"]:
-            info = resp["InstanceTypes"][0]
-            instance_type_cache[itype] = {
-                "vCPUs": info["VCpuInfo"]["DefaultVCpus"],
-                "MemoryMiB": info["MemoryInfo"]["SizeInMiB"]
-            }
-
-    # --- Step 4: Fetch all volumes in batches ---
-    for i in range(0, len(volume_ids), 500):  # API limit is 500
-        batch = volume_ids[i:i+500]
-        resp = ec2.describe_volumes(VolumeIds=batch)
-        for vol in resp["Volumes"]:
-            volume_map[vol["VolumeId"]] = vol["Size"]
-
-    # --- Step 5: Build instance records ---
-    for instance in all_instances:
-        instance_id = instance["InstanceId"]
-        private_ip = instance.get("PrivateIpAddress")
-        instance_type = instance["InstanceType"]
-
-        # Name tag
-        name = None
-        for tag in instance.get("Tags", []):
-            if tag["Key"] == "Name":
-                name = tag["Value"]
-                break
-
-        # vCPUs and Memory from cache
-        type_info = instance_type_cache.get(instance_type, {})
-        vcpus = type_info.get("vCPUs")
-        memory_mib = type_info.get("MemoryMiB")
-
-        # Sum disk sizes
-        total_disk_gb = 0
-        for bd in instance.get("BlockDeviceMappings", []):
-            vol_id = bd.get("Ebs", {}).get("VolumeId")
-            if vol_id and vol_id in volume_map:
-                total_disk_gb += volume_map[vol_id]
-
-        instances.append({
-            "InstanceId": instance_id,
-            "Name": name,
-            "PrivateIp": private_ip,
-            "InstanceType": instance_type,
-            "vCPUs": vcpus,
-            "MemoryMiB": memory_mib,
-            "TotalDiskGiB": total_disk_gb
-        })
-
-    return instances
-
-
-def write_to_csv(instances, output_file):
-    """Write list of instance dicts to a CSV file."""
-    if not instances:
-        print("No instances found.")
-        return
+    ec2 = ec2 or get_client("ec2", region=region_name)
+    return list(iter_instances(ec2, type_cache=type_cache, **kwargs))
+
+
+def iter_instances(ec2, type_cache=None, volume_workers=VOLUME_WORKERS, volume_scan=False, snapshot=None):
+    """
+    Yield EC2 instance records as describe_instances pages arrive, so
+    memory stays bounded by one page however large the fleet is.
+
+    Each page is enriched before the next is fetched:
+    - instance-type attributes come from type_cache (a persistent
+      InstanceTypeCache by default), so repeated runs rarely call the API
+    - volume sizes come from concurrent describe_volumes batches of the
+      page's volume IDs, or, with volume_scan=True, from one filtered scan
+      of all attached volumes done up front (fewer calls on large fleets)
+    With snapshot (an InventoryScan), instances whose fingerprint matches
+    the stored one reuse their stored record and only new or changed
+    instances are enriched; the caller commits the snapshot afterwards.
+    Pass an ec2 client to scan another account or region (see aws_fanout).
+    """
+    owns_cache = type_cache is None
+    type_cache = type_cache or InstanceTypeCache()
+
+    volume_map = None
+
+    try:
+        with ThreadPoolExecutor(max_workers=volume_workers) as executor:
+            paginator = ec2.get_paginator("describe_instances")
+            for page in paginator.paginate(PaginationConfig={"PageSize": 1000}):
+                page_instances = [
+                    instance
+                    for reservation in page.get("Reservations", [])
+                    for instance in reservation.get("Instances", [])
+                ]
+                if not page_instances:
+                    continue
+
+                # Records of unchanged instances come from the store
+                records = {}
+                fingerprints = {}
+                if snapshot is not None:
+                    for instance in page_instances:
+                        fp = fingerprints[instance["InstanceId"]] = instance_fingerprint(instance)
+                        record = snapshot.reuse(instance["InstanceId"], fp)
+                        if record is not None:
+                            records[instance["InstanceId"]] = record
+                to_enrich = [i for i in page_instances if i["InstanceId"] not in records]
+
+                if to_enrich:
+                    # Instance type attributes from the cache (batched fills)
+                    type_map = type_cache.get_many(ec2, {i["InstanceType"] for i in to_enrich})
+
+                    # Volume sizes for this page, fetched concurrently
+                    if volume_scan and volume_map is None:
+                        volume_map = scan_volume_sizes(ec2)
+                    page_volumes = volume_map
+                    if page_volumes is None:
+                        volume_ids = [
+                            bd["Ebs"]["VolumeId"]
+                            for instance in to_enrich
+                            for bd in instance.get("BlockDeviceMappings", [])
+                            if "Ebs" in bd
+                        ]
+                        page_volumes = {}
+                        batches = [volume_ids[i:i + VOLUME_BATCH_SIZE]
+                                   for i in range(0, len(volume_ids), VOLUME_BATCH_SIZE)]
+                        for sizes in executor.map(lambda batch: volume_sizes(ec2, batch), batches):
+                            page_volumes.update(sizes)
+
+                    for instance in to_enrich:
+                        record = instance_record(instance, type_map, page_volumes)
+                        if snapshot is not None:
+                            snapshot.put(instance["InstanceId"], fingerprints[instance["InstanceId"]], record)
+                        records[instance["InstanceId"]] = record
+
+                for instance in page_instances:
+                    yield records[instance["InstanceId"]]
+    finally:
+        if owns_cache:
+            type_cache.save()
+
+
+def volume_sizes(ec2, volume_ids):
+    """Sizes (GiB) of up to 500 volumes with one describe_volumes call."""
+    try:
+        resp = ec2.describe_volumes(VolumeIds=volume_ids)
+    except ClientError as e:
+        # A volume deleted since the instance page was read fails the whole call
+        if "NotFound" not in e.response.get("Error", {}).get("Code", ""):
+            raise
+        if len(volume_ids) == 1:
+            return {}
+        middle = len(volume_ids) // 2
+        return {**volume_sizes(ec2, volume_ids[:middle]), **volume_sizes(ec2, volume_ids[middle:])}
+    return {vol["VolumeId"]: vol["Size"] for vol in resp["Volumes"]}
+
 
-    with open(output_file, "w", newline="") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=instances[0].keys())
-        writer.writeheader()
-        writer.writerows(instances)
+def scan_volume_sizes(ec2):
+    """Sizes of every attached volume in the region from one paginated scan."""
+    sizes = {}
+    paginator = ec2.get_paginator("describe_volumes")
+    pages = paginator.paginate(
+        Filters=[{"Name": "attachment.status", "Values": ["attached", "attaching"]}],
+        PaginationConfig={"PageSize": 500}
+    )
+    for page in pages:
+        for vol in page["Volumes"]:
+            sizes[vol["VolumeId"]] = vol["Size"]
+    return sizes
+
+
+def instance_fingerprint(instance):
+    """
+    Fingerprint of the raw fields that decide whether an instance needs
+    re-enriching. Volume resizes do not show up here; they are picked up
+    when the stored record is older than the store's refresh age.
+    """
+    return fingerprint([
+        instance.get("State", {}).get("Name"),
+        instance.get("LaunchTime"),
+        instance["InstanceType"],
+        instance.get("PrivateIpAddress"),
+        sorted((t["Key"], t["Value"]) for t in instance.get("Tags", [])),
+        sorted(bd["Ebs"]["VolumeId"] for bd in instance.get("BlockDeviceMappings", []) if "Ebs" in bd),
+    ])
+
+
+def instance_record(instance, type_map, volume_map):
+    """Build the output record for one instance."""
+    # Name tag
+    name = None
+    for tag in instance.get("Tags", []):
+        if tag["Key"] == "Name":
+            name = tag["Value"]
+            break
+
+    # vCPUs and Memory from cache
+    type_info = type_map.get(instance["InstanceType"], {})
+
+    # Sum disk sizes
+    total_disk_gb = 0
+    for bd in instance.get("BlockDeviceMappings", []):
+        vol_id = bd.get("Ebs", {}).get("VolumeId")
+        if vol_id and vol_id in volume_map:
+            total_disk_gb += volume_map[vol_id]
+
+    return {
+        "InstanceId": instance["InstanceId"],
+        "Name": name,
+        "PrivateIp": instance.get("PrivateIpAddress"),
+        "InstanceType": instance["InstanceType"],
+        "vCPUs": type_info.get("vCPUs"),
+        "MemoryMiB": type_info.get("MemoryMiB"),
+        "TotalDiskGiB": total_disk_gb
+    }
+
+
+def write_to_csv(instances, output_file, fieldnames=FIELDNAMES):
+    """
+    Write instance dicts (any iterable, consumed as it is produced) to a
+    CSV file. Returns the number of rows written.
+    """
+    count = 0
+    csvfile = None
+    try:
+        for instance in instances:
+            if csvfile is None:
+                # Open lazily so no file is written when there are no instances
+                csvfile = open(output_file, "w", newline="")
+                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                writer.writeheader()
+            writer.writerow(instance)
+            count += 1
+    finally:
+        if csvfile:
+            csvfile.close()
+
+    if not count:
+        print("No instances found.")
+    return count
 
 
 if __name__ == "__main__":
-    region = "us-west-2"                  # Change as needed
-    output_file = "ec2_instance_details.csv"
+    parser = argparse.ArgumentParser(
+        description="List EC2 instances with vCPUs, memory and total EBS disk size."
+    )
+    parser.add_argument("--region", default="us-west-2",
+                        help="Region to scan when not fanning out (default: us-west-2)")
+    parser.add_argument("--output", default="ec2_instance_details.csv",
+                        help="Output CSV file (default: ec2_instance_details.csv)")
+    parser.add_argument("--type-cache", default=str(DEFAULT_CACHE_FILE),
+                        help=f"Instance-type cache file (default: {DEFAULT_CACHE_FILE})")
+    parser.add_argument("--type-cache-ttl-hours", type=float, default=DEFAULT_TTL_HOURS,
+                        help=f"Refresh cached instance types older than this (default: {DEFAULT_TTL_HOURS})")
+    parser.add_argument("--warm-type-cache", action="store_true",
+                        help="Load every instance type of each scanned region into the cache first")
+    parser.add_argument("--volume-workers", type=int, default=VOLUME_WORKERS,
+                        help=f"Concurrent describe_volumes batches per page (default: {VOLUME_WORKERS})")
+    parser.add_argument("--volume-scan", action="store_true",
+                        help="Read all attached volume sizes with one paginated scan instead of "
+                             "per-page lookups (fewer calls for very large fleets)")
+    add_fanout_arguments(parser)
+    add_store_arguments(parser)
+    args = parser.parse_args()
+    if args.diff_file and not args.store:
+        parser.error("--diff-file requires --store")
+
+    # One cache and one store shared by all regions/accounts scanned in this run
+    type_cache = InstanceTypeCache(args.type_cache, args.type_cache_ttl_hours)
+    store = InventoryStore(args.store, args.refresh_hours) if args.store else None
+    own_account = current_account() if store else None
+
+    def scan(ec2, snapshot=None):
+        if args.warm_type_cache:
+            type_cache.warm(ec2)
+        return iter_instances(
+            ec2, type_cache=type_cache, volume_workers=args.volume_workers, volume_scan=args.volume_scan,
+            snapshot=snapshot
+        )
+
+    def begin(ec2, target=None):
+        if not store:
+            return None
+        return store.begin(STORE_KIND, (target and target.account) or own_account, ec2.meta.region_name)
+
+    def scan_target(ec2, target):
+        # A generator, so fanout() can spool the rows; the snapshot is only committed after the last page
+        snapshot = begin(ec2, target)
+        yield from scan(ec2, snapshot)
+        if snapshot:
+            commit_and_report(snapshot, args.diff_file)
 
-    instances = list_instances(region)
-    write_to_csv(instances, output_file)
+    failures = []
+    try:
+        if fanout_enabled(args):
+            # Each target is spooled to disk and added to the CSV only once its scan succeeds
+            report = CsvReport(args.output, ["Account", "Region"] + FIELDNAMES)
+            try:
+                _, failures = fanout_from_args(scan_target, args, report=report)
+            finally:
+                report.close()
+            count = report.count
+            if not count:
+                print("No instances found.")
+        else:
+            # Rows are written as each describe_instances page is enriched
+            ec2 = get_client("ec2", region=args.region, max_pool_connections=args.volume_workers + 1)
+            snapshot = begin(ec2)
+            count = write_to_csv(scan(ec2, snapshot), args.output)
+            if snapshot:
+                commit_and_report(snapshot, args.diff_file)
+    finally:
+        type_cache.save()
+        if store:
+            store.close()
 
-    print(f"Saved {len(instances)} instances to {output_file}")
+    print(f"Saved {count} instances to {args.output}")
+    print(f"Instance-type API calls: {type_cache.api_calls} (cache: {args.type_cache})")
+    print_failures(failures)
@@ -0,0 +1,201 @@
+"""
+Incremental inventory snapshots for the EC2 and EBS reports.
+
+The store is a SQLite file holding the last snapshot of each (kind,
+account, region): one row per resource with a fingerprint of its raw API
+description and the enriched record that was reported for it. On the next
+run a resource whose fingerprint is unchanged (and whose record is younger
+than max_age) reuses the stored record, so only new or changed resources go
+through the expensive enrichment calls. Committing a scan replaces the
+stored snapshot and returns the added / removed / changed resources.
+
+    store = InventoryStore('inventory.db')
+    scan = store.begin('ec2-instance', account, region)
+    record = scan.reuse(instance_id, fingerprint(fields))   # None -> enrich
+    scan.put(instance_id, fingerprint(fields), record)
+    changes = scan.commit()
+
+Scripts add the standard flags with add_store_arguments() and finish each
+scan with commit_and_report(), which also appends the changes to the
+--diff-file (JSON Lines) that dashboards consume:
+
+    --store inventory.db  --diff-file changes.jsonl  --refresh-hours 24
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_REFRESH_HOURS = 24.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshot (
+    kind TEXT NOT NULL,
+    account TEXT NOT NULL,
+    region TEXT NOT NULL,
+    taken_at REAL NOT NULL,
+    PRIMARY KEY (kind, account, region)
+);
+CREATE TABLE IF NOT EXISTS resource (
+    kind TEXT NOT NULL,
+    account TEXT NOT NULL,
+    region TEXT NOT NULL,
+    resource_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    record TEXT NOT NULL,
+    enriched_at REAL NOT NULL,
+    PRIMARY KEY (kind, account, region, resource_id)
+) WITHOUT ROWID;
+"""
+
+
+def fingerprint(fields) -> str:
+    """Stable hash of the raw fields that decide whether a resource changed."""
+    payload = json.dumps(fields, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def tag_map(resource: dict) -> dict:
+    return {t['Key']: t['Value'] for t in resource.get('Tags', [])}
+
+
+class InventoryStore:
+    """SQLite store of the last inventory snapshot per (kind, account, region)."""
+
+    def __init__(self, path: str, max_age_hours: float = DEFAULT_REFRESH_HOURS):
+        self.path = Path(path)
+        self.max_age = max_age_hours * 3600
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        # One connection shared by fanned-out scans
+        self._lock = threading.Lock()
+
+    def begin(self, kind: str, account: str, region: str) -> 'InventoryScan':
+        """Start a scan of one (kind, account, region) against its last snapshot."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT resource_id, fingerprint, record, enriched_at FROM resource'
+                ' WHERE kind = ? AND account = ? AND region = ?',
+                (kind, account, region)
+            ).fetchall()
+        previous = {rid: (fp, json.loads(record), enriched_at) for rid, fp, record, enriched_at in rows}
+        return InventoryScan(self, (kind, account, region), previous)
+
+    def _replace(self, scope: tuple, current: dict) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                'DELETE FROM resource WHERE kind = ? AND account = ? AND region = ?', scope
+            )
+            self._conn.executemany(
+                'INSERT INTO resource (kind, account, region, resource_id, fingerprint, record, enriched_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (scope + (rid, fp, json.dumps(record, default=str), enriched_at)
+                 for rid, (fp, record, enriched_at) in current.items())
+            )
+            self._conn.execute(
+                'INSERT OR REPLACE INTO snapshot (kind, account, region, taken_at) VALUES (?, ?, ?, ?)',
+                scope + (time.time(),)
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class InventoryScan:
+    """One in-progress scan; see InventoryStore.begin()."""
+
+    def __init__(self, store: InventoryStore, scope: tuple, previous: dict):
+        self.store = store
+        self.scope = scope
+        self.previous = previous
+        self.current = {}
+        self.reused = 0
+
+    def reuse(self, resource_id: str, fp: str):
+        """
+        The stored record if the resource is unchanged and was enriched
+        within max_age; None if it is new, changed or stale.
+        """
+        old = self.previous.get(resource_id)
+        if old is None or old[0] != fp or time.time() - old[2] > self.store.max_age:
+            return None
+        self.current[resource_id] = old
+        self.reused += 1
+        return old[1]
+
+    def put(self, resource_id: str, fp: str, record: dict) -> None:
+        """Record a freshly enriched resource."""
+        self.current[resource_id] = (fp, record, time.time())
+
+    def commit(self) -> list:
+        """
+        Save this scan as the new snapshot and return its changes as dicts
+        with Change ('added', 'removed' or 'changed'), ResourceId, Record and,
+        for changed resources, Previous. A resource counts as changed when
+        its reported record differs.
+        """
+        changes = []
+        for rid, (fp, record, _) in self.current.items():
+            old = self.previous.get(rid)
+            if old is None:
+                changes.append({'Change': 'added', 'ResourceId': rid, 'Record': record})
+            elif old[1] != record:
+                changes.append({'Change': 'changed', 'ResourceId': rid, 'Record': record, 'Previous': old[1]})
+        for rid, (_, record, _) in self.previous.items():
+            if rid not in self.current:
+                changes.append({'Change': 'removed', 'ResourceId': rid, 'Record': record})
+        self.store._replace(self.scope, self.current)
+        return changes
+
+
+# Fanned-out scans append to the same diff file
+_write_lock = threading.Lock()
+
+
+def write_changes(changes: list, path: str, scope: tuple = None) -> None:
+    """Append changes to a JSON Lines file, tagged with Kind/Account/Region."""
+    kind, account, region = scope or (None, None, None)
+    lines = [
+        json.dumps({'Kind': kind, 'Account': account, 'Region': region, **change}, default=str) + '\n'
+        for change in changes
+    ]
+    with _write_lock, open(path, 'a') as f:
+        f.writelines(lines)
+
+
+def summarize(changes: list) -> str:
+    counts = {c: sum(1 for change in changes if change['Change'] == c) for c in ('added', 'removed', 'changed')}
+    return ', '.join(f'{count} {change}' for change, count in counts.items())
+
+
+def commit_and_report(scan: InventoryScan, diff_file: str = None) -> list:
+    """Commit a finished scan, append its changes to diff_file and print a summary."""
+    changes = scan.commit()
+    if diff_file and changes:
+        write_changes(changes, diff_file, scan.scope)
+    kind, account, region = scan.scope
+    reused = f' ({scan.reused} of {len(scan.current)} reused from the store)' if scan.reused else ''
+    print(f'{kind} {account}/{region}: {summarize(changes)}{reused}')
+    return changes
+
+
+def add_store_arguments(parser, refresh: bool = True) -> None:
+    """
+    Add the standard --store/--diff-file/--refresh-hours flags; refresh=False
+    leaves out --refresh-hours for scripts that never reuse stored records.
+    """
+    group = parser.add_argument_group('incremental inventory')
+    group.add_argument('--store',
+                       help='SQLite inventory store of the last snapshot, used to report changes'
+                            + ('; only new or changed resources are re-enriched' if refresh else ''))
+    group.add_argument('--diff-file',
+                       help='Append added/removed/changed resources to this JSON Lines file (needs --store)')
+    if refresh:
+        group.add_argument('--refresh-hours', type=float, default=DEFAULT_REFRESH_HOURS,
+                           help='Re-enrich unchanged resources older than this '
+                                f'(default: {DEFAULT_REFRESH_HOURS:g})')
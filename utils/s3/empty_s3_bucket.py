@@ -1,122 +1,246 @@
 ###############################################################################
 # Script to empty an S3 bucket including all object versions and delete markers
 # Skips objects locked under Object Lock (Compliance or Governance)
-# Usage: python empty_s3_bucket.py <bucket-name>
+# Usage: python empty_s3_bucket.py <bucket-name> [--shards N] [--stream] [--inventory PATH]
 ###############################################################################
-import boto3
+import argparse
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
 from botocore.exceptions import ClientError
 
-def empty_bucket(bucket_name):
-    s3_client = boto3.client("s3")
-
-    while True:
-        versions_to_delete = []
-        locked_objects = []
-
-        paginator = s3_client.get_paginator("list_object_versions")
-        for page in paginator.paginate(Bucket=bucket_name):
-            # Collect object versions
-            for v in page.get("Versions", []):
-                if is_locked(s3_client, bucket_name, v["Key"], v["VersionId"]):
-                    locked_objects.append((v["Key"], v["VersionId"]))
-                else:
-                    versions_to_delete.append(
-                        {"Key": v["Key"], "VersionId": v["VersionId"]}
+# Shared helpers (aws_clients) live in the parent utils/ folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from aws_clients import get_client
+from s3_inventory import inventory_pages, iter_source_objects
+from s3_listing import iter_pages
+from s3_object_lock import lock_status, object_lock_enabled
+from s3_throttle import NO_RETRIES, AdaptiveConcurrency, call_with_backoff
+
+# Starting concurrency of each limiter; AIMD raises it towards the worker count
+INITIAL_CONCURRENCY = 8
+
+# Per-key delete_objects error codes worth retrying
+RETRYABLE_DELETE_ERRORS = {"InternalError", "SlowDown", "ServiceUnavailable", "OperationAborted"}
+
+def empty_bucket(bucket_name, shards=1, lock_workers=32, delete_workers=8, stream=False, inventory=None):
+    s3_client = get_client("s3", max_pool_connections=shards)
+    # Lock probes and deletes retry through call_with_backoff, so botocore
+    # retries are off for them and every throttle reaches the limiter
+    request_client = get_client(
+        "s3", max_pool_connections=lock_workers + delete_workers, max_attempts=NO_RETRIES
+    )
+
+    # Per-version lock checks are only needed when the bucket has Object Lock
+    lock_enabled = object_lock_enabled(s3_client, bucket_name)
+    if lock_enabled:
+        print(f"Object Lock is enabled on {bucket_name}; checking versions for retention/legal hold.")
+    # Lock probes and deletes adapt separately, so a throttle on one does not cap the other
+    lock_limiter = AdaptiveConcurrency(initial=min(lock_workers, INITIAL_CONCURRENCY), maximum=lock_workers)
+    delete_limiter = AdaptiveConcurrency(initial=min(delete_workers, INITIAL_CONCURRENCY), maximum=delete_workers)
+    locked_count = 0
+    locked_sample = []
+
+    with ThreadPoolExecutor(max_workers=lock_workers) as lock_executor, \
+            ThreadPoolExecutor(max_workers=delete_workers) as delete_executor:
+
+        def deletable_batches():
+            """Yield one delete batch per listing page, minus locked versions."""
+            nonlocal locked_count
+            if inventory:
+                # Inventory report or key file instead of the LIST APIs
+                pages = inventory_pages(
+                    iter_source_objects(inventory, s3_client, bucket_name), versions=True
+                )
+            else:
+                pages = iter_pages(s3_client, bucket_name, versions=True, shards=shards, ordered=False)
+            for page in pages:
+                # Collect object versions
+                versions = page.get("Versions", [])
+                if lock_enabled:
+                    locked = lock_executor.map(
+                        lambda v: is_locked(request_client, bucket_name, v["Key"], v["VersionId"], lock_limiter),
+                        versions
                     )
-
-            # Collect delete markers
-            for m in page.get("DeleteMarkers", []):
-                if is_locked(s3_client, bucket_name, m["Key"], m["VersionId"]):
-                    locked_objects.append((m["Key"], m["VersionId"]))
                 else:
-                    versions_to_delete.append(
-                        {"Key": m["Key"], "VersionId": m["VersionId"]}
-                    )
-
-        if not versions_to_delete and not locked_objects:
-            print(f"✅ Bucket {bucket_name} is already empty.")
-            return
-
-        confirm = input(
-            f"About to permanently delete {len(versions_to_delete)} objects "
-            f"(and skip {len(locked_objects)} locked objects) from '{bucket_name}'. Proceed? [y/N]: "
-        ).strip().lower()
-        if confirm != "y":
-            print("Aborted by user.")
-            return
-
-        # Delete in chunks of 1000
-        if versions_to_delete:
-            print(f"Deleting {len(versions_to_delete)} objects from bucket {bucket_name} ...")
-            try:
-                for i in range(0, len(versions_to_delete), 1000):
-                    chunk = versions_to_delete[i : i + 1000]
-                    s3_client.delete_objects(
-                        Bucket=bucket_name,
-                        Delete={"Objects": chunk}
-                    )
-            except ClientError as e:
-                print(f"Error deleting objects: {e}")
+                    locked = [False] * len(versions)
+
+                batch = []
+                for v, v_locked in zip(versions, locked):
+                    if v_locked:
+                        locked_count += 1
+                        if len(locked_sample) < 10:
+                            locked_sample.append((v["Key"], v["VersionId"]))
+                    else:
+                        batch.append(object_identifier(v))
+
+                # Collect delete markers (these cannot carry retention or legal holds)
+                for m in page.get("DeleteMarkers", []):
+                    batch.append(object_identifier(m))
+
+                # Pages hold at most 1000 entries, the DeleteObjects limit
+                for i in range(0, len(batch), 1000):
+                    yield batch[i : i + 1000]
+
+        if stream:
+            confirm = input(
+                f"About to permanently delete ALL object versions and delete markers "
+                f"(skipping locked objects) from '{bucket_name}' as they are listed. Proceed? [y/N]: "
+            ).strip().lower()
+            if confirm != "y":
+                print("Aborted by user.")
                 return
-
-        # Print locked summary
-        if locked_objects:
-            print(f"\n⚠️ Skipped {len(locked_objects)} locked objects:")
-            for key, vid in locked_objects[:10]:  # show only first 10
-                print(f"  {key} (VersionId={vid})")
-            if len(locked_objects) > 10:
-                print(f"  ... and {len(locked_objects) - 10} more")
-
-        # Check if bucket is now empty (ignoring locked objects)
-        remaining = 0
-        for page in paginator.paginate(Bucket=bucket_name):
-            remaining += len(page.get("Versions", [])) + len(page.get("DeleteMarkers", []))
-
-        if remaining == len(locked_objects):
-            print(f"\n✅ Bucket {bucket_name} emptied (except {len(locked_objects)} locked objects).")
-            return
+            batches = deletable_batches()
         else:
-            print(f"\n{remaining} objects still remain (retrying ...)")
+            batches = list(deletable_batches())
+            total = sum(len(batch) for batch in batches)
+            if not total and not locked_count:
+                print(f"✅ Bucket {bucket_name} is already empty.")
+                return
 
+            confirm = input(
+                f"About to permanently delete {total} objects "
+                f"(and skip {locked_count} locked objects) from '{bucket_name}'. Proceed? [y/N]: "
+            ).strip().lower()
+            if confirm != "y":
+                print("Aborted by user.")
+                return
 
-def is_locked(s3_client, bucket, key, version_id):
-    """Check if a specific version is under Object Lock retention or legal hold."""
-    try:
-        resp = s3_client.get_object_retention(
-            Bucket=bucket,
-            Key=key,
-            VersionId=version_id
-        )
-        if resp.get("Retention"):
-            return True
-    except ClientError as e:
-        if e.response["Error"]["Code"] not in (
-            "NoSuchObjectLockConfiguration",
-            "InvalidRequest",
-        ):
-            raise
-
-    try:
-        resp = s3_client.get_object_legal_hold(
-            Bucket=bucket,
-            Key=key,
-            VersionId=version_id
+        print(f"Deleting objects from bucket {bucket_name} ...")
+        deleted, failed = delete_pipelined(
+            request_client, bucket_name, batches, delete_executor, delete_limiter, delete_workers * 2
         )
-        if resp.get("LegalHold", {}).get("Status") == "ON":
-            return True
-    except ClientError as e:
-        if e.response["Error"]["Code"] not in (
-            "NoSuchObjectLockConfiguration",
-            "InvalidRequest",
-        ):
-            raise
 
-    return False
+    print(f"Deleted {deleted} objects.")
+
+    # Print locked summary
+    if locked_count:
+        print(f"\n⚠️ Skipped {locked_count} locked objects:")
+        for key, vid in locked_sample:  # show only first 10
+            print(f"  {key} (VersionId={vid})")
+        if locked_count > len(locked_sample):
+            print(f"  ... and {locked_count - len(locked_sample)} more")
+
+    # Remaining objects are derived from the delete results, not a re-listing
+    if failed:
+        print(f"\n❌ Failed to delete {len(failed)} objects:")
+        for error in failed[:10]:
+            print(f"  {error['Key']} (VersionId={error.get('VersionId')}): {error.get('Code')} {error.get('Message', '')}")
+        if len(failed) > 10:
+            print(f"  ... and {len(failed) - 10} more")
+        print(f"\n{len(failed) + locked_count} objects remain in bucket {bucket_name}.")
+    else:
+        print(f"\n✅ Bucket {bucket_name} emptied (except {locked_count} locked objects).")
+
+
+def delete_pipelined(s3_client, bucket, batches, executor, limiter, max_in_flight):
+    """
+    Issue delete_objects batches concurrently, keeping at most max_in_flight
+    requests outstanding so batches are only pulled from the listing as fast
+    as they can be deleted. Returns (deleted count, list of per-key errors).
+    """
+    deleted = 0
+    failed = []
+    in_flight = set()
+
+    def collect(done):
+        nonlocal deleted
+        for future in done:
+            batch_deleted, batch_errors = future.result()
+            deleted += batch_deleted
+            failed.extend(batch_errors)
+
+    for batch in batches:
+        if not batch:
+            continue
+        if len(in_flight) >= max_in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done)
+        in_flight.add(executor.submit(delete_batch, s3_client, bucket, batch, limiter))
+    collect(wait(in_flight).done)
+    return deleted, failed
+
+
+def delete_batch(s3_client, bucket, objects, limiter=None, max_attempts=5):
+    """
+    Delete up to 1000 versions with one delete_objects call, retrying keys
+    that failed with transient per-key errors. Returns (deleted count, list
+    of per-key errors that could not be resolved).
+    """
+    deleted = 0
+    failed = []
+    for attempt in range(1, max_attempts + 1):
+        try:
+            resp = call_with_backoff(
+                s3_client.delete_objects,
+                limiter=limiter,
+                Bucket=bucket,
+                Delete={"Objects": objects, "Quiet": True}
+            )
+        except ClientError as e:
+            error = e.response.get("Error", {})
+            failed.extend(
+                {**o, "Code": error.get("Code"), "Message": error.get("Message")}
+                for o in objects
+            )
+            return deleted, failed
+
+        # Quiet mode only reports failures; permanent ones (e.g. AccessDenied) are final
+        errors = resp.get("Errors", [])
+        deleted += len(objects) - len(errors)
+        retry = [e for e in errors if e.get("Code") in RETRYABLE_DELETE_ERRORS]
+        failed.extend(e for e in errors if e.get("Code") not in RETRYABLE_DELETE_ERRORS)
+        if not retry:
+            break
+        if attempt == max_attempts:
+            failed.extend(retry)
+            break
+        objects = [object_identifier(e) for e in retry]
+        time.sleep(random.uniform(0, 0.2 * 2 ** attempt))
+    return deleted, failed
+
+
+def object_identifier(entry):
+    """
+    Build a delete_objects identifier. Key-file entries carry no VersionId,
+    in which case the key itself is deleted (a delete marker if versioned).
+    """
+    if entry.get("VersionId"):
+        return {"Key": entry["Key"], "VersionId": entry["VersionId"]}
+    return {"Key": entry["Key"]}
+
+
+def is_locked(s3_client, bucket, key, version_id, limiter=None):
+    """Check if a specific version is under Object Lock retention or legal hold."""
+    status = lock_status(s3_client, bucket, key, version_id, limiter=limiter)
+    return status["Mode"] is not None or status["LegalHold"]
 
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) != 2:
-        print(f"Usage: {sys.argv[0]} <bucket-name>")
-        sys.exit(1)
-    empty_bucket(sys.argv[1])
+    parser = argparse.ArgumentParser(
+        description="Empty an S3 bucket including all object versions and delete markers."
+    )
+    parser.add_argument("bucket_name", help="S3 bucket name")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Split the keyspace into this many ranges and list them concurrently (default: 1)")
+    parser.add_argument("--lock-workers", type=int, default=32,
+                        help="Concurrent Object Lock checks when the bucket has Object Lock enabled (default: 32)")
+    parser.add_argument("--delete-workers", type=int, default=8,
+                        help="Concurrent delete_objects batches (default: 8)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Delete each listing page as it arrives instead of listing everything first "
+                             "(confirmation is asked up front without object counts)")
+    parser.add_argument("--inventory", metavar="PATH",
+                        help="Read object versions from an S3 Inventory manifest.json (local or s3://) "
+                             "or a local key file instead of listing the bucket")
+    args = parser.parse_args()
+    empty_bucket(
+        args.bucket_name,
+        shards=args.shards,
+        lock_workers=args.lock_workers,
+        delete_workers=args.delete_workers,
+        stream=args.stream,
+        inventory=args.inventory
+    )
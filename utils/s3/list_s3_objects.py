@@ -1,55 +1,115 @@
 ###############################################################################
 # Script to list all object versions and delete markers in an S3 bucket
 # and detect Object Lock retention
-# Usage: python list_s3_objects.py <bucket-name>
+# Usage: python list_s3_objects.py <bucket-name> [--shards N] [--inventory PATH]
+#        [--probe-workers N] [--probe-rate R] [--output FILE.parquet|FILE.arrow]
+#        [--stats [--prefix-depth N] [--max-prefixes N] [--top N]]
 ###############################################################################
-import boto3
-from collections import Counter
-from botocore.exceptions import ClientError
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
-def list_versions(bucket_name):
-    s3_client = boto3.client("s3")
-    paginator = s3_client.get_paginator("list_object_versions")
-    page_iterator = paginator.paginate(Bucket=bucket_name)
+# Shared helpers (aws_clients) live in the parent utils/ folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from aws_clients import get_client
+from s3_columnar import ColumnarWriter
+from s3_inventory import inventory_pages, iter_source_objects
+from s3_listing import iter_pages
+from s3_object_lock import lock_status, object_lock_enabled
+from s3_stats import KeyStats
+from s3_throttle import NO_RETRIES, TokenBucket
+
+NOT_LOCKED = {"Mode": None, "RetainUntilDate": None, "LegalHold": False}
+
+# Columns of the --output report, one row per object version
+REPORT_COLUMNS = [
+    ("key", "string"),
+    ("version_id", "string"),
+    ("size", "int64"),
+    ("storage_class", "string"),
+    ("last_modified", "timestamp"),
+    ("is_latest", "bool"),
+    ("lock_mode", "string"),
+    ("retain_until", "timestamp"),
+    ("legal_hold", "bool"),
+]
+
+def list_versions(bucket_name, shards=1, inventory=None, probe_workers=32, probe_rate=500.0, output=None,
+                  stats=False, prefix_depth=1, max_prefixes=10000, top=20):
+    s3_client = get_client("s3", max_pool_connections=shards)
+    # Probes retry through call_with_backoff, so botocore retries are off for
+    # them and hidden retries cannot bypass the --probe-rate token bucket
+    probe_client = get_client("s3", max_pool_connections=probe_workers, max_attempts=NO_RETRIES)
+    # Fails fast if pyarrow is missing, before any listing work
+    writer = ColumnarWriter(output, REPORT_COLUMNS) if output else None
+    if inventory:
+        # Inventory report or key file instead of the LIST APIs
+        page_iterator = inventory_pages(
+            iter_source_objects(inventory, s3_client, bucket_name), versions=True
+        )
+    else:
+        # Page order does not matter for counting, so take pages as they arrive
+        page_iterator = iter_pages(
+            s3_client, bucket_name, versions=True, shards=shards, ordered=False
+        )
 
     versions_count = 0
     markers_count = 0
     locked_count = 0
-    key_counter = Counter()
+    # Fixed-size sketches instead of a counter per key
+    key_stats = KeyStats(prefix_depth, max_prefixes, top) if stats else None
 
     print(f"Bucket: {bucket_name}\n")
 
-    for page in page_iterator:
-        for v in page.get("Versions", []):
-            versions_count += 1
-            key_counter[v["Key"]] += 1
-
-            try:
-                resp = s3_client.get_object_retention(
-                    Bucket=bucket_name,
-                    Key=v["Key"],
-                    VersionId=v["VersionId"]
-                )
-                retention = resp.get("Retention")
-                if retention:
+    # Retention / legal-hold probes are only needed when the bucket has Object Lock
+    lock_enabled = object_lock_enabled(s3_client, bucket_name)
+    rate = TokenBucket(probe_rate)
+
+    def probe(v):
+        if not lock_enabled:
+            return NOT_LOCKED
+        return lock_status(probe_client, bucket_name, v["Key"], v["VersionId"], rate=rate)
+
+    executor = ThreadPoolExecutor(max_workers=probe_workers)
+    try:
+        for page in page_iterator:
+            versions = page.get("Versions", [])
+            # map() keeps at most one page of probes queued and preserves order
+            for v, status in zip(versions, executor.map(probe, versions)):
+                versions_count += 1
+                if key_stats:
+                    key_stats.add(v["Key"], v.get("Size"))
+
+                locked = status["Mode"] is not None or status["LegalHold"]
+                if locked:
                     locked_count += 1
-                    mode = retention["Mode"]
-                    until = retention["RetainUntilDate"]
-                    print(
-                        f"LOCKED ({mode})  Key={v['Key']}  "
-                        f"VersionId={v['VersionId']}  Until={until}"
-                    )
-            except ClientError as e:
-                # Ignore if bucket has no object lock config or version not locked
-                if e.response["Error"]["Code"] not in (
-                    "NoSuchObjectLockConfiguration",
-                    "InvalidRequest",
-                ):
-                    raise
-
-        for m in page.get("DeleteMarkers", []):
-            markers_count += 1
-            key_counter[m["Key"]] += 1
+                    if not writer:
+                        print(
+                            f"LOCKED ({status['Mode'] or 'LEGAL HOLD'})  Key={v['Key']}  "
+                            f"VersionId={v['VersionId']}  Until={status['RetainUntilDate']}"
+                        )
+                if writer:
+                    writer.write({
+                        "key": v["Key"],
+                        "version_id": v["VersionId"],
+                        "size": v.get("Size"),
+                        "storage_class": v.get("StorageClass"),
+                        "last_modified": v.get("LastModified"),
+                        "is_latest": v.get("IsLatest"),
+                        "lock_mode": status["Mode"],
+                        "retain_until": status["RetainUntilDate"],
+                        "legal_hold": status["LegalHold"],
+                    })
+
+            for m in page.get("DeleteMarkers", []):
+                markers_count += 1
+                if key_stats:
+                    key_stats.add(m["Key"], delete_marker=True)
+    finally:
+        executor.shutdown(cancel_futures=True)
+        if writer:
+            writer.close()
 
     total_entries = versions_count + markers_count
     print("\nSummary:")
@@ -57,13 +117,70 @@ def list_versions(bucket_name):
     print(f"  Total delete markers  : {markers_count}")
     print(f"  Total entries (all)   : {total_entries}")
     print(f"  Total locked objects  : {locked_count}")
+    if writer:
+        print(f"  Report                : {output} ({writer.rows_written} rows)")
+
+    if key_stats and total_entries:
+        print_stats(key_stats)
 
     if total_entries == 0:
         print("\n✅ Bucket has no versions or delete markers.")
 
+def print_stats(key_stats):
+    """Print the streaming key statistics gathered with --stats."""
+    distinct = max(1, key_stats.distinct_keys.estimate())
+    print("\nKey statistics (estimated):")
+    print(f"  Distinct keys         : ~{distinct}")
+    print(f"  Entries per key (avg) : {key_stats.entries / distinct:.2f}")
+
+    # Space-Saving counts are upper bounds; count - error is a guaranteed minimum
+    print(f"\n  Keys with the most versions/delete markers (top {key_stats.top_keys.k}, at most / at least):")
+    for key, count, error in key_stats.top_keys.items():
+        print(f"    {count:>10} / {count - error:<10}  {key}")
+
+    prefixes = key_stats.prefixes
+    print(f"\n  Largest prefixes (depth {prefixes.depth}, {len(prefixes.totals)} tracked):")
+    for prefix, objects, size in prefixes.largest():
+        print(f"    {size:>16} bytes  {objects:>10} versions  {prefix or '(root)'}")
+
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) != 2:
-        print(f"Usage: {sys.argv[0]} <bucket-name>")
-        sys.exit(1)
-    list_versions(sys.argv[1])
+    parser = argparse.ArgumentParser(
+        description="List object versions and delete markers in an S3 bucket and detect Object Lock retention."
+    )
+    parser.add_argument("bucket_name", help="S3 bucket name")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Split the keyspace into this many ranges and list them concurrently (default: 1)")
+    parser.add_argument("--inventory", metavar="PATH",
+                        help="Read objects from an S3 Inventory manifest.json (local or s3://) "
+                             "or a local key file instead of listing the bucket")
+    parser.add_argument("--probe-workers", type=int, default=32,
+                        help="Concurrent retention / legal-hold probes (default: 32)")
+    parser.add_argument("--probe-rate", type=float, default=500.0,
+                        help="Maximum Object Lock probe requests per second (default: 500)")
+    parser.add_argument("--output", metavar="FILE",
+                        help="Write one row per version (key, version, size, storage class, lock mode, "
+                             "retain-until, legal hold) to a Parquet (.parquet) or Arrow IPC (.arrow) file; "
+                             "requires pyarrow")
+    parser.add_argument("--stats", action="store_true",
+                        help="Report distinct keys, keys with the most versions and per-prefix totals "
+                             "using fixed-memory sketches")
+    parser.add_argument("--prefix-depth", type=int, default=1,
+                        help="Number of '/'-separated segments per prefix for --stats totals (default: 1)")
+    parser.add_argument("--max-prefixes", type=int, default=10000,
+                        help="Maximum prefixes tracked by --stats; further prefixes are grouped as (other) "
+                             "(default: 10000)")
+    parser.add_argument("--top", type=int, default=20,
+                        help="Number of keys with the most versions shown by --stats (default: 20)")
+    args = parser.parse_args()
+    list_versions(
+        args.bucket_name,
+        shards=args.shards,
+        inventory=args.inventory,
+        probe_workers=args.probe_workers,
+        probe_rate=args.probe_rate,
+        output=args.output,
+        stats=args.stats,
+        prefix_depth=args.prefix_depth,
+        max_prefixes=args.max_prefixes,
+        top=args.top
+    )
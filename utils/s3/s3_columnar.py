@@ -0,0 +1,81 @@
+"""
+Columnar (Parquet / Arrow IPC) report writer for the S3 utilities.
+
+Rows are buffered and written as record batches, so reports of any size are
+produced with flat memory and can be aggregated later (pandas, DuckDB,
+Athena, ...) without another pass over S3. The format follows the file
+extension: .parquet, or .arrow / .feather / .ipc for Arrow IPC. Requires
+pyarrow, which is only imported when a report is requested.
+"""
+from pathlib import Path
+
+ARROW_SUFFIXES = ('.arrow', '.feather', '.ipc')
+
+# Column type names -> pyarrow type factories
+_TYPES = {
+    'string': lambda pa: pa.string(),
+    'int64': lambda pa: pa.int64(),
+    'bool': lambda pa: pa.bool_(),
+    'timestamp': lambda pa: pa.timestamp('us', tz='UTC'),
+}
+
+
+class ColumnarWriter:
+    """
+    Append rows (dicts) to a Parquet or Arrow IPC file.
+
+    Args:
+        path: Output file; the extension selects the format
+        columns: Ordered (name, type) pairs, type one of 'string', 'int64',
+            'bool' or 'timestamp'
+        batch_size: Rows buffered per record batch
+    """
+
+    def __init__(self, path: str, columns: list, batch_size: int = 50000):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("Columnar output requires pyarrow (pip install pyarrow)") from None
+
+        self._pa = pa
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.schema = pa.schema([(name, _TYPES[kind](pa)) for name, kind in columns])
+        self._buffer = {name: [] for name, _ in columns}
+        self._rows = 0
+        self.rows_written = 0
+
+        if self.path.suffix.lower() in ARROW_SUFFIXES:
+            self._writer = pa.ipc.new_file(str(self.path), self.schema)
+        else:
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(str(self.path), self.schema, compression='zstd')
+
+    def write(self, row: dict) -> None:
+        for name, values in self._buffer.items():
+            values.append(row.get(name))
+        self._rows += 1
+        if self._rows >= self.batch_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+        batch = self._pa.RecordBatch.from_pydict(self._buffer, schema=self.schema)
+        if hasattr(self._writer, 'write_batch'):
+            self._writer.write_batch(batch)
+        else:
+            self._writer.write_table(self._pa.Table.from_batches([batch]))
+        self.rows_written += self._rows
+        self._buffer = {name: [] for name in self._buffer}
+        self._rows = 0
+
+    def close(self) -> None:
+        self._flush()
+        self._writer.close()
+
+    def __enter__(self) -> 'ColumnarWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
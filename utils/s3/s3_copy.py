@@ -1,8 +1,21 @@
-import boto3
 from botocore.exceptions import ClientError
 import logging
+from urllib.parse import urlencode
 import argparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import queue
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+# Shared helpers (aws_clients) live in the parent utils/ folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from aws_clients import get_client
+from s3_inventory import inventory_pages, iter_source_objects
+from s3_journal import CopyJournal
+from s3_listing import iter_pages
+from s3_throttle import NO_RETRIES, AdaptiveConcurrency, call_with_backoff
 
 # Configure logging
 logging.basicConfig(
@@ -11,59 +24,134 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize S3 client once at module level
-s3_client = boto3.client('s3')
+# Initialize S3 clients once at module level; copy_bucket resizes their pools.
+# request_client (botocore retries off) is used for calls made through
+# call_with_backoff, so every throttle reaches the adaptive limiter.
+s3_client = get_client('s3')
+request_client = get_client('s3', max_attempts=NO_RETRIES)
 
+# Multipart copy settings (CopyObject itself is limited to 5 GiB)
+MIB = 1024 * 1024
+DEFAULT_MULTIPART_THRESHOLD = 1024 * MIB
+DEFAULT_PART_SIZE = 256 * MIB
+DEFAULT_PART_CONCURRENCY = 8
+MIN_PART_SIZE = 5 * MIB
+MAX_PARTS = 10000
 
-def list_all_objects(bucket: str, prefix: str = '') -> list:
+# Concurrent copy requests to start with before adapting up to --max-workers
+INITIAL_CONCURRENCY = 10
+
+# Number of plan entries per journal checkpoint / DeleteObjects batch
+CHUNK_SIZE = 1000
+
+# Marks the end of the listing stream for copy workers
+_SENTINEL = object()
+
+
+def iter_objects(
+    bucket: str,
+    prefix: str = '',
+    start_after: str = None,
+    list_shards: int = 1
+) -> Iterator[dict]:
     """
-    List all objects in an S3 bucket.
+    Stream object summaries from an S3 bucket one listing page at a time.
+    
+    Keys are always yielded in order, even when the listing is sharded.
     
     Args:
         bucket: Bucket name
         prefix: Optional prefix to filter objects
+        start_after: Optional key to start listing after (exclusive)
+        list_shards: Number of key ranges to list concurrently
         
-    Returns:
-        List of object keys
+    Yields:
+        Object summaries (Key, Size, ETag, ...) as returned by list_objects_v2
     """
-    objects = []
-    paginator = s3_client.get_paginator('list_objects_v2')
-    
     try:
-        pages = paginator.paginate(Bucket=bucket, Prefix=prefix)
-        
-        for page in pages:
-            if 'Contents' in page:
-                for obj in page['Contents']:
-                    objects.append(obj['Key'])
-                    
-        logger.info(f"Found {len(objects)} objects in source bucket")
-        return objects
-        
+        for page in iter_pages(
+            s3_client,
+            bucket,
+            prefix,
+            start_after=start_after,
+            shards=list_shards
+        ):
+            yield from page['Contents']
+            
     except ClientError as e:
         logger.error(f"Error listing objects: {e}")
         raise
 
 
-def copy_object(source_bucket: str, dest_bucket: str, key: str) -> bool:
+def list_all_objects(bucket: str, prefix: str = '') -> list:
+    """
+    List all objects in an S3 bucket.
+    
+    Materialises the whole listing in memory; copy_bucket streams via
+    iter_objects instead.
+    
+    Args:
+        bucket: Bucket name
+        prefix: Optional prefix to filter objects
+        
+    Returns:
+        List of object keys
+    """
+    objects = [obj['Key'] for obj in iter_objects(bucket, prefix)]
+    logger.info(f"Found {len(objects)} objects in source bucket")
+    return objects
+
+
+def copy_object(
+    source_bucket: str,
+    dest_bucket: str,
+    key: str,
+    size: int = None,
+    multipart_threshold: int = DEFAULT_MULTIPART_THRESHOLD,
+    part_size: int = DEFAULT_PART_SIZE,
+    part_concurrency: int = DEFAULT_PART_CONCURRENCY,
+    limiter: AdaptiveConcurrency = None
+) -> bool:
     """
     Copy a single object from source to destination bucket.
     
+    Objects larger than multipart_threshold are copied with a multipart
+    upload whose parts are copied server-side in parallel.
+    
     Args:
         source_bucket: Source bucket name
         dest_bucket: Destination bucket name
         key: Object key to copy
+        size: Object size in bytes if already known from the listing
+        multipart_threshold: Size in bytes above which multipart copy is used
+        part_size: Multipart part size in bytes
+        part_concurrency: Number of parts copied in parallel per object
+        limiter: Optional adaptive limiter shared by all copy requests
         
     Returns:
         True if successful, False otherwise
     """
     try:
         copy_source = {'Bucket': source_bucket, 'Key': key}
-        s3_client.copy_object(
-            CopySource=copy_source,
-            Bucket=dest_bucket,
-            Key=key
-        )
+        head = None
+        if size is None:
+            head = call_with_backoff(
+                request_client.head_object, Bucket=source_bucket, Key=key, limiter=limiter
+            )
+            size = head['ContentLength']
+        
+        if size > multipart_threshold:
+            multipart_copy(
+                copy_source, dest_bucket, key, size, part_size, part_concurrency, limiter, head
+            )
+        else:
+            call_with_backoff(
+                request_client.copy_object,
+                limiter=limiter,
+                CopySource=copy_source,
+                Bucket=dest_bucket,
+                Key=key
+            )
         logger.info(f"Successfully copied: {key}")
         return True
         
@@ -72,68 +160,397 @@ def copy_object(source_bucket: str, dest_bucket: str, key: str) -> bool:
         return False
 
 
+def multipart_copy(
+    copy_source: dict,
+    dest_bucket: str,
+    key: str,
+    size: int,
+    part_size: int = DEFAULT_PART_SIZE,
+    part_concurrency: int = DEFAULT_PART_CONCURRENCY,
+    limiter: AdaptiveConcurrency = None,
+    head: dict = None
+) -> None:
+    """
+    Copy a large object with CreateMultipartUpload + parallel UploadPartCopy.
+    
+    The part size is raised if needed to stay within the 10,000 part limit.
+    The upload is aborted if any part fails so no orphaned parts are billed.
+    Metadata, tags, storage class and encryption settings are carried over
+    as CopyObject does for smaller objects.
+    
+    Args:
+        copy_source: Source {'Bucket': ..., 'Key': ...}
+        dest_bucket: Destination bucket name
+        key: Destination object key
+        size: Source object size in bytes
+        part_size: Multipart part size in bytes
+        part_concurrency: Number of parts copied in parallel
+        limiter: Optional adaptive limiter shared by all copy requests
+        head: Source head_object response, if the caller already has it
+        
+    Raises:
+        ClientError: If any multipart API call fails
+    """
+    part_size = max(part_size, MIN_PART_SIZE, -(-size // MAX_PARTS))
+    
+    # CopyObject carries metadata and tags over implicitly, multipart uploads do not
+    if head is None:
+        head = call_with_backoff(request_client.head_object, limiter=limiter, **copy_source)
+    upload_args = {
+        name: head[name] for name in (
+            'ContentType', 'CacheControl', 'ContentDisposition',
+            'ContentEncoding', 'ContentLanguage', 'Metadata', 'Expires',
+            'WebsiteRedirectLocation', 'StorageClass', 'ServerSideEncryption',
+            'SSEKMSKeyId', 'BucketKeyEnabled'
+        ) if head.get(name)
+    }
+    tag_set = call_with_backoff(
+        request_client.get_object_tagging, limiter=limiter, **copy_source
+    )['TagSet']
+    if tag_set:
+        upload_args['Tagging'] = urlencode([(tag['Key'], tag['Value']) for tag in tag_set])
+    
+    upload_id = call_with_backoff(
+        request_client.create_multipart_upload,
+        limiter=limiter,
+        Bucket=dest_bucket,
+        Key=key,
+        **upload_args
+    )['UploadId']
+    
+    def copy_part(part_number: int, start: int) -> dict:
+        end = min(start + part_size, size) - 1
+        resp = call_with_backoff(
+            request_client.upload_part_copy,
+            limiter=limiter,
+            Bucket=dest_bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            CopySource=copy_source,
+            CopySourceRange=f'bytes={start}-{end}'
+        )
+        return {'PartNumber': part_number, 'ETag': resp['CopyPartResult']['ETag']}
+    
+    offsets = range(0, size, part_size)
+    try:
+        with ThreadPoolExecutor(max_workers=part_concurrency) as executor:
+            parts = list(executor.map(copy_part, range(1, len(offsets) + 1), offsets))
+        
+        call_with_backoff(
+            request_client.complete_multipart_upload,
+            limiter=limiter,
+            Bucket=dest_bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts}
+        )
+        logger.info(f"Multipart copy of {key} completed in {len(parts)} parts")
+        
+    except Exception:
+        # Keep the original error if the abort fails too
+        try:
+            s3_client.abort_multipart_upload(Bucket=dest_bucket, Key=key, UploadId=upload_id)
+        except Exception as abort_error:
+            logger.error(f"Could not abort multipart upload {upload_id} for {key}: {abort_error}")
+        raise
+
+
+def objects_match(source: dict, dest: dict) -> bool:
+    """
+    Decide whether a destination object is already identical to its source.
+    
+    Multipart ETags depend on the part layout rather than the content, so
+    when either side was uploaded in parts only the sizes are compared.
+    
+    Args:
+        source: Source object summary from list_objects_v2
+        dest: Destination object summary from list_objects_v2
+        
+    Returns:
+        True if the destination copy can be skipped
+    """
+    if source['Size'] != dest['Size']:
+        return False
+    if '-' in source['ETag'] or '-' in dest['ETag']:
+        return True
+    return source['ETag'] == dest['ETag']
+
+
+def iter_sync_plan(
+    source_bucket: str,
+    dest_bucket: str,
+    prefix: str = '',
+    start_after: str = None,
+    list_shards: int = 1
+) -> Iterator[tuple]:
+    """
+    Merge-join the source and destination listings on key.
+    
+    Both listings come back in UTF-8 binary key order, which matches Python
+    string ordering, so a single pass over the two streams is enough.
+    
+    Args:
+        source_bucket: Source bucket name
+        dest_bucket: Destination bucket name
+        prefix: Optional prefix to filter objects
+        start_after: Optional key to start both listings after (exclusive)
+        list_shards: Number of key ranges to list concurrently per bucket
+        
+    Yields:
+        (action, object) tuples where action is 'copy' (missing or changed
+        at the destination), 'skip' (identical) or 'delete' (destination only)
+    """
+    source_objects = iter_objects(source_bucket, prefix, start_after, list_shards)
+    dest_objects = iter_objects(dest_bucket, prefix, start_after, list_shards)
+    src = next(source_objects, None)
+    dst = next(dest_objects, None)
+    
+    while src is not None or dst is not None:
+        if dst is None or (src is not None and src['Key'] < dst['Key']):
+            yield 'copy', src
+            src = next(source_objects, None)
+        elif src is None or dst['Key'] < src['Key']:
+            yield 'delete', dst
+            dst = next(dest_objects, None)
+        else:
+            yield ('skip' if objects_match(src, dst) else 'copy'), src
+            src = next(source_objects, None)
+            dst = next(dest_objects, None)
+
+
+def delete_keys(bucket: str, keys: list, limiter: AdaptiveConcurrency = None) -> int:
+    """
+    Delete a batch of up to 1000 keys with a single DeleteObjects call.
+    
+    Args:
+        bucket: Bucket name
+        keys: Object keys to delete
+        limiter: Optional adaptive limiter shared by all requests
+        
+    Returns:
+        Number of keys deleted
+    """
+    try:
+        resp = call_with_backoff(
+            request_client.delete_objects,
+            limiter=limiter,
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True}
+        )
+    except ClientError as e:
+        logger.error(f"Error deleting {len(keys)} objects: {e}")
+        return 0
+    
+    for error in resp.get('Errors', []):
+        logger.error(f"Error deleting {error['Key']}: {error.get('Message')}")
+    return len(keys) - len(resp.get('Errors', []))
+
+
 def copy_bucket(
     source_bucket: str,
     dest_bucket: str,
     prefix: str = '',
     max_workers: int = 10,
-    dry_run: bool = False
+    dry_run: bool = False,
+    queue_size: int = 1000,
+    multipart_threshold: int = DEFAULT_MULTIPART_THRESHOLD,
+    part_size: int = DEFAULT_PART_SIZE,
+    part_concurrency: int = DEFAULT_PART_CONCURRENCY,
+    sync: bool = False,
+    delete: bool = False,
+    journal: CopyJournal = None,
+    list_shards: int = 1,
+    inventory: str = None
 ) -> dict:
     """
     Copy all objects from source to destination bucket while retaining paths.
     
+    A producer thread streams listing pages into a bounded queue that the
+    copy workers drain, so memory stays constant regardless of bucket size
+    and copying starts as soon as the first page arrives.
+    
+    Concurrency starts at INITIAL_CONCURRENCY and adapts between 1 and
+    max_workers (AIMD): it grows while latency and error rates stay healthy
+    and halves on SlowDown/503 throttling, which is retried with jittered
+    backoff rather than counted as a failure.
+    
+    In sync mode only objects that are missing or differ (size or ETag) at
+    the destination are copied; see iter_sync_plan.
+    
+    With a journal, the plan is checkpointed in chunks of CHUNK_SIZE keys.
+    A resumed job lists from the journal watermark, skips keys that already
+    completed and retries earlier failures first.
+    
     Args:
         source_bucket: Source bucket name
         dest_bucket: Destination bucket name
         prefix: Optional prefix to filter objects
-        max_workers: Number of parallel threads
+        max_workers: Maximum number of concurrent copy requests
         dry_run: If True, only list objects without copying
+        queue_size: Maximum number of listed objects waiting to be copied
+        multipart_threshold: Size in bytes above which multipart copy is used
+        part_size: Multipart part size in bytes
+        part_concurrency: Number of parts copied in parallel per object
+        sync: If True, skip objects already identical at the destination
+        delete: In sync mode, also delete objects that exist only at the destination
+        journal: Optional checkpoint journal to record progress in and resume from
+        list_shards: Number of key ranges to list concurrently
+        inventory: Optional S3 Inventory manifest.json or key file to read
+            source objects from instead of listing (not with sync or journal)
         
     Returns:
         Dictionary with copy statistics
     """
     logger.info(f"Starting copy from {source_bucket} to {dest_bucket}")
     
-    # List all objects
-    objects = list_all_objects(source_bucket, prefix)
+    # Listing threads for both buckets share one client, copy workers the other
+    global s3_client, request_client
+    s3_client = get_client('s3', max_pool_connections=2 * list_shards)
+    request_client = get_client('s3', max_pool_connections=max_workers, max_attempts=NO_RETRIES)
     
-    if not objects:
-        logger.warning("No objects found to copy")
-        return {'total': 0, 'success': 0, 'failed': 0}
+    start_after, completed, retries = None, set(), []
+    if journal:
+        start_after = journal.job['start_after']
+        completed = journal.completed_keys()
+        retries = journal.failed_objects()
+        if start_after:
+            logger.info(
+                f"Resuming after key {start_after!r} ({len(completed)} keys already"
+                f" completed beyond it, {len(retries)} failures to retry)"
+            )
+    
+    if inventory:
+        if sync or journal:
+            raise ValueError("Inventory input is unordered and cannot be used with sync or a journal")
+        plan = (
+            ('copy', obj)
+            for page in inventory_pages(iter_source_objects(inventory, s3_client, source_bucket))
+            for obj in page['Contents']
+            if obj['Key'].startswith(prefix)
+        )
+    elif sync:
+        plan = iter_sync_plan(source_bucket, dest_bucket, prefix, start_after, list_shards)
+    else:
+        plan = (
+            ('copy', obj)
+            for obj in iter_objects(source_bucket, prefix, start_after, list_shards)
+        )
     
     if dry_run:
-        logger.info(f"DRY RUN: Would copy {len(objects)} objects")
-        for obj in objects:
-            logger.info(f"  - {obj}")
-        return {'total': len(objects), 'success': 0, 'failed': 0, 'dry_run': True}
-    
-    # Copy objects in parallel
-    success_count = 0
-    failed_count = 0
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(copy_object, source_bucket, dest_bucket, key): key 
-            for key in objects
-        }
+        stats = {'total': 0, 'success': 0, 'failed': 0, 'skipped': 0, 'deleted': 0}
+        for action, obj in plan:
+            if action == 'copy':
+                stats['total'] += 1
+                logger.info(f"  - {obj['Key']}")
+            elif action == 'skip':
+                stats['skipped'] += 1
+            elif delete:
+                stats['deleted'] += 1
+                logger.info(f"  - delete {obj['Key']}")
+        if not stats['total'] and not stats['deleted']:
+            logger.warning("No objects found to copy")
+            return stats
+        logger.info(
+            f"DRY RUN: Would copy {stats['total']} objects"
+            f" (skip {stats['skipped']}, delete {stats['deleted']})"
+        )
+        stats['dry_run'] = True
+        return stats
+    
+    # Workers are the ceiling; the limiter decides how many requests are in flight
+    limiter = AdaptiveConcurrency(
+        initial=min(max_workers, INITIAL_CONCURRENCY),
+        maximum=max_workers
+    )
+    work_queue = queue.Queue(maxsize=queue_size)
+    stats_lock = threading.Lock()
+    stats = {'total': 0, 'success': 0, 'failed': 0, 'skipped': 0, 'deleted': 0}
+    
+    def produce():
+        chunk = {'no': 0, 'size': 0, 'queued': 0, 'end_key': None}
+        to_delete = []
+        
+        def end_chunk():
+            # Deletes are flushed per chunk so the journal never checkpoints past them
+            if to_delete:
+                stats['deleted'] += delete_keys(dest_bucket, to_delete, limiter)
+                to_delete.clear()
+            if journal:
+                journal.close_chunk(chunk['no'], chunk['end_key'], chunk['queued'])
+            chunk.update(no=chunk['no'] + 1, size=0, queued=0)
         
-        for future in as_completed(futures):
+        try:
+            for obj in retries:
+                with stats_lock:
+                    stats['total'] += 1
+                work_queue.put((None, obj))
+            
+            for action, obj in plan:
+                if not chunk['size'] and journal:
+                    journal.open_chunk(chunk['no'])
+                chunk['size'] += 1
+                chunk['end_key'] = obj['Key']
+                
+                if action == 'copy' and obj['Key'] not in completed:
+                    with stats_lock:
+                        stats['total'] += 1
+                    chunk['queued'] += 1
+                    work_queue.put((chunk['no'], obj))
+                elif action != 'delete':
+                    stats['skipped'] += 1
+                elif delete:
+                    to_delete.append(obj['Key'])
+                
+                if chunk['size'] == CHUNK_SIZE:
+                    end_chunk()
+            if chunk['size']:
+                end_chunk()
+        finally:
+            # One sentinel per worker so every consumer exits
+            for _ in range(max_workers):
+                work_queue.put(_SENTINEL)
+    
+    def consume():
+        while True:
+            item = work_queue.get()
+            if item is _SENTINEL:
+                return
+            chunk_no, obj = item
             try:
-                if future.result():
-                    success_count += 1
-                else:
-                    failed_count += 1
+                ok = copy_object(
+                    source_bucket,
+                    dest_bucket,
+                    obj['Key'],
+                    size=obj.get('Size'),
+                    multipart_threshold=multipart_threshold,
+                    part_size=part_size,
+                    part_concurrency=part_concurrency,
+                    limiter=limiter
+                )
             except Exception as e:
                 logger.error(f"Unexpected error: {e}")
-                failed_count += 1
+                ok = False
+            if journal:
+                journal.record(chunk_no, obj['Key'], ok, obj.get('Size'))
+            with stats_lock:
+                stats['success' if ok else 'failed'] += 1
     
-    stats = {
-        'total': len(objects),
-        'success': success_count,
-        'failed': failed_count
-    }
+    # Copy objects in parallel as pages arrive
+    with ThreadPoolExecutor(max_workers=max_workers + 1) as executor:
+        producer = executor.submit(produce)
+        workers = [executor.submit(consume) for _ in range(max_workers)]
+        for worker in workers:
+            worker.result()
+        producer.result()
     
-    logger.info(f"Copy complete: {stats}")
+    if journal:
+        journal.finish()
+    
+    if not stats['total'] and not stats['skipped']:
+        logger.warning("No objects found to copy")
+    
+    logger.info(f"Copy complete: {stats} (final concurrency: {limiter.limit})")
     return stats
 
 
@@ -144,12 +561,14 @@ def main():
     
     parser.add_argument(
         'source_bucket',
-        help='Source S3 bucket name'
+        nargs='?',
+        help='Source S3 bucket name (taken from the journal with --resume)'
     )
     
     parser.add_argument(
         'destination_bucket',
-        help='Destination S3 bucket name'
+        nargs='?',
+        help='Destination S3 bucket name (taken from the journal with --resume)'
     )
     
     parser.add_argument(
@@ -168,19 +587,143 @@ def main():
         '--max-workers',
         type=int,
         default=10,
-        help='Number of parallel copy threads (default: 10)'
+        help='Maximum number of concurrent copy requests; concurrency adapts up to this limit and backs off on throttling (default: 10)'
+    )
+    
+    parser.add_argument(
+        '--queue-size',
+        type=int,
+        default=1000,
+        help='Maximum number of listed objects buffered ahead of the copy threads (default: 1000)'
+    )
+    
+    parser.add_argument(
+        '--multipart-threshold-mb',
+        type=int,
+        default=DEFAULT_MULTIPART_THRESHOLD // MIB,
+        help=f'Use multipart copy for objects larger than this many MiB (default: {DEFAULT_MULTIPART_THRESHOLD // MIB})'
+    )
+    
+    parser.add_argument(
+        '--part-size-mb',
+        type=int,
+        default=DEFAULT_PART_SIZE // MIB,
+        help=f'Multipart copy part size in MiB (default: {DEFAULT_PART_SIZE // MIB})'
+    )
+    
+    parser.add_argument(
+        '--part-concurrency',
+        type=int,
+        default=DEFAULT_PART_CONCURRENCY,
+        help=f'Number of parts copied in parallel per large object (default: {DEFAULT_PART_CONCURRENCY})'
+    )
+    
+    parser.add_argument(
+        '--sync',
+        action='store_true',
+        help='Only copy objects that are missing or differ (size/ETag) in the destination bucket'
+    )
+    
+    parser.add_argument(
+        '--delete',
+        action='store_true',
+        help='With --sync, delete destination objects that do not exist in the source'
+    )
+    
+    parser.add_argument(
+        '--list-shards',
+        type=int,
+        default=1,
+        help='Split the keyspace into this many ranges and list them concurrently (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--inventory',
+        metavar='PATH',
+        help='Read source objects from an S3 Inventory manifest.json (local or s3://) '
+             'or a local key file instead of listing the source bucket (no --sync/--resume)'
+    )
+    
+    parser.add_argument(
+        '--journal-dir',
+        default='.s3_copy_jobs',
+        help='Directory for checkpoint journals (default: .s3_copy_jobs)'
+    )
+    
+    parser.add_argument(
+        '--job-id',
+        help='Name for the new copy job journal (default: random ID)'
+    )
+    
+    parser.add_argument(
+        '--resume',
+        metavar='JOB',
+        help='Resume an interrupted copy job from its checkpoint journal'
     )
     
     args = parser.parse_args()
     
+    journal = None
+    if args.resume:
+        journal = CopyJournal.open(args.journal_dir, args.resume)
+        job = journal.job
+        if job['finished_at']:
+            print(f"Job {args.resume} already completed")
+            journal.close()
+            return
+        args.source_bucket = job['source_bucket']
+        args.destination_bucket = job['dest_bucket']
+        args.prefix = job['prefix']
+        args.sync = bool(job['sync'])
+        args.delete = bool(job['delete_extra'])
+    elif not args.source_bucket or not args.destination_bucket:
+        parser.error('source_bucket and destination_bucket are required unless --resume is used')
+    
+    if args.delete and not args.sync:
+        parser.error('--delete requires --sync')
+    
+    if args.inventory and (args.sync or args.resume):
+        parser.error('--inventory cannot be combined with --sync or --resume')
+    
+    # Journal checkpoints rely on key-ordered listings, which inventories are not
+    if not args.resume and not args.dry_run and not args.inventory:
+        journal = CopyJournal.create(
+            args.journal_dir,
+            args.source_bucket,
+            args.destination_bucket,
+            prefix=args.prefix,
+            sync=args.sync,
+            delete=args.delete,
+            job_id=args.job_id
+        )
+        logger.info(f"Job ID: {journal.job['job_id']} (resume with --resume {journal.job['job_id']})")
+    
     # Execute copy
-    stats = copy_bucket(
-        source_bucket=args.source_bucket,
-        dest_bucket=args.destination_bucket,
-        prefix=args.prefix,
-        max_workers=args.max_workers,
-        dry_run=args.dry_run
-    )
+    try:
+        stats = copy_bucket(
+            source_bucket=args.source_bucket,
+            dest_bucket=args.destination_bucket,
+            prefix=args.prefix,
+            max_workers=args.max_workers,
+            dry_run=args.dry_run,
+            queue_size=args.queue_size,
+            multipart_threshold=args.multipart_threshold_mb * MIB,
+            part_size=args.part_size_mb * MIB,
+            part_concurrency=args.part_concurrency,
+            sync=args.sync,
+            delete=args.delete,
+            journal=journal,
+            list_shards=args.list_shards,
+            inventory=args.inventory
+        )
+    finally:
+        # A clean run has nothing left to resume, so its journal is not kept
+        if journal and journal.finished:
+            job_id = journal.job['job_id']
+            journal.remove()
+            logger.info(f"Job {job_id} completed; journal removed")
+        elif journal:
+            journal.close()
     
     print(f"\nFinal statistics: {stats}")
 
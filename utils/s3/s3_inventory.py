@@ -0,0 +1,199 @@
+"""
+S3 Inventory manifest and key-file input for the S3 utilities.
+
+Lets list_s3_objects, s3_copy and empty_s3_bucket take their objects from
+an S3 Inventory report (CSV or Parquet) or a plain key file instead of the
+LIST APIs. Inventory data files are streamed one at a time: CSV files are
+decompressed on the fly from the S3 response body, and Parquet files are
+read in record batches, so the full key set is never held in memory.
+
+Manifests and data files may be local (e.g. fixtures) or in S3:
+
+    s3://inventory-bucket/source-bucket/config-id/2024-01-01T01-00Z/manifest.json
+    ./fixtures/manifest.json     (data files resolved next to the manifest)
+    ./keys.txt[.gz]              (one key per line)
+"""
+import csv
+import gzip
+import io
+import json
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator
+from urllib.parse import unquote_plus
+
+# Inventory field names (CSV fileSchema and Parquet columns) -> listing API names
+FIELD_NAMES = {
+    'Key': 'Key', 'key': 'Key',
+    'VersionId': 'VersionId', 'version_id': 'VersionId',
+    'IsLatest': 'IsLatest', 'is_latest': 'IsLatest',
+    'IsDeleteMarker': 'IsDeleteMarker', 'is_delete_marker': 'IsDeleteMarker',
+    'Size': 'Size', 'size': 'Size',
+    'LastModifiedDate': 'LastModified', 'last_modified_date': 'LastModified',
+    'ETag': 'ETag', 'e_tag': 'ETag',
+    'StorageClass': 'StorageClass', 'storage_class': 'StorageClass',
+}
+
+PARQUET_BATCH_SIZE = 10000
+
+
+def _split_s3_uri(uri: str) -> tuple:
+    bucket, _, key = uri[len('s3://'):].partition('/')
+    return bucket, key
+
+
+def _normalize(record: dict) -> dict:
+    """Map an inventory record onto the shape of a listing entry."""
+    obj = {FIELD_NAMES[name]: value for name, value in record.items() if name in FIELD_NAMES}
+    for flag in ('IsLatest', 'IsDeleteMarker'):
+        if isinstance(obj.get(flag), str):
+            obj[flag] = obj[flag].lower() == 'true'
+    if obj.get('Size') in ('', None):
+        obj['Size'] = 0
+    else:
+        obj['Size'] = int(obj['Size'])
+    if obj.get('ETag') and not obj['ETag'].startswith('"'):
+        obj['ETag'] = f'"{obj["ETag"]}"'
+    if isinstance(obj.get('LastModified'), str):
+        obj['LastModified'] = datetime.fromisoformat(obj['LastModified'].replace('Z', '+00:00'))
+    obj['VersionId'] = obj.get('VersionId') or None
+    return obj
+
+
+def _open_binary(location: str, client):
+    """Open a local path or s3:// URI as a readable binary stream."""
+    if location.startswith('s3://'):
+        bucket, key = _split_s3_uri(location)
+        return client.get_object(Bucket=bucket, Key=key)['Body']
+    return open(location, 'rb')
+
+
+def load_manifest(manifest: str, client=None) -> dict:
+    """Read an inventory manifest.json from a local path or s3:// URI."""
+    with _open_binary(manifest, client) as f:
+        return json.load(f)
+
+
+def _data_file_location(manifest: str, manifest_doc: dict, file_key: str) -> str:
+    """Resolve a manifest 'files' entry to a local path or s3:// URI."""
+    if not manifest.startswith('s3://'):
+        base = Path(manifest).parent
+        for candidate in (base / file_key, base / Path(file_key).name):
+            if candidate.exists():
+                return str(candidate)
+    dest_bucket = manifest_doc['destinationBucket'].split(':::')[-1]
+    return f's3://{dest_bucket}/{file_key}'
+
+
+def _iter_csv_file(location: str, schema: list, client) -> Iterator[dict]:
+    with _open_binary(location, client) as raw, \
+            gzip.GzipFile(fileobj=raw) as gz, \
+            io.TextIOWrapper(gz, encoding='utf-8', newline='') as text:
+        for row in csv.reader(text):
+            record = dict(zip(schema, row))
+            # Keys are URL-encoded in CSV inventories
+            record['Key'] = unquote_plus(record['Key'])
+            yield _normalize(record)
+
+
+def _iter_parquet_file(location: str, client) -> Iterator[dict]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet inventories require pyarrow (pip install pyarrow)") from None
+
+    with tempfile.NamedTemporaryFile(suffix='.parquet') as tmp:
+        # Parquet needs random access, so stage one data file at a time
+        if location.startswith('s3://'):
+            bucket, key = _split_s3_uri(location)
+            client.download_fileobj(bucket, key, tmp)
+            tmp.flush()
+            path = tmp.name
+        else:
+            path = location
+
+        parquet_file = pq.ParquetFile(path)
+        columns = [c for c in parquet_file.schema_arrow.names if c in FIELD_NAMES]
+        for batch in parquet_file.iter_batches(batch_size=PARQUET_BATCH_SIZE, columns=columns):
+            for record in batch.to_pylist():
+                yield _normalize(record)
+
+
+def iter_inventory(manifest: str, client=None, bucket: str = None) -> Iterator[dict]:
+    """
+    Stream every entry of an S3 Inventory report.
+
+    Args:
+        manifest: Local path or s3:// URI of the report's manifest.json
+        client: boto3 S3 client (needed when anything lives in S3)
+        bucket: If given, the manifest's sourceBucket must match it
+
+    Yields:
+        Entries shaped like listing results: Key, VersionId (None when the
+        inventory has no versions), IsLatest, IsDeleteMarker, Size, ETag, ...
+    """
+    doc = load_manifest(manifest, client)
+    if bucket and doc.get('sourceBucket') not in (None, bucket):
+        raise ValueError(
+            f"Inventory manifest is for bucket {doc['sourceBucket']!r}, not {bucket!r}"
+        )
+
+    file_format = doc.get('fileFormat', 'CSV').upper()
+    if file_format not in ('CSV', 'PARQUET'):
+        raise ValueError(f"Unsupported inventory format: {doc['fileFormat']}")
+    schema = [name.strip() for name in doc.get('fileSchema', '').split(',')]
+
+    for data_file in doc['files']:
+        location = _data_file_location(manifest, doc, data_file['key'])
+        if file_format == 'CSV':
+            yield from _iter_csv_file(location, schema, client)
+        else:
+            yield from _iter_parquet_file(location, client)
+
+
+def iter_key_file(path: str) -> Iterator[dict]:
+    """Stream keys from a local file with one key per line (optionally .gz)."""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            key = line.rstrip('\n')
+            if key:
+                yield {'Key': key, 'VersionId': None, 'Size': None}
+
+
+def iter_source_objects(source: str, client=None, bucket: str = None) -> Iterator[dict]:
+    """Stream entries from an inventory manifest (*.json) or a key file."""
+    if source.endswith('.json'):
+        return iter_inventory(source, client, bucket)
+    return iter_key_file(source)
+
+
+def inventory_pages(objects: Iterable[dict], versions: bool = False, page_size: int = 1000) -> Iterator[dict]:
+    """
+    Group inventory entries into pages shaped like s3_listing.iter_pages
+    output, so callers can consume either source the same way.
+
+    With versions=False only current, non-delete-marker objects are kept
+    ({'Contents': [...]}); with versions=True entries are split into
+    {'Versions': [...], 'DeleteMarkers': [...]}.
+    """
+    page = []
+    for obj in objects:
+        if not versions and (obj.get('IsDeleteMarker') or obj.get('IsLatest') is False):
+            continue
+        page.append(obj)
+        if len(page) == page_size:
+            yield _to_page(page, versions)
+            page = []
+    if page:
+        yield _to_page(page, versions)
+
+
+def _to_page(entries: list, versions: bool) -> dict:
+    if not versions:
+        return {'Contents': entries}
+    return {
+        'Versions': [e for e in entries if not e.get('IsDeleteMarker')],
+        'DeleteMarkers': [e for e in entries if e.get('IsDeleteMarker')],
+    }
@@ -0,0 +1,208 @@
+"""
+Checkpoint journal for resumable s3_copy jobs.
+
+Each job is a small SQLite database (WAL mode) under the journal directory.
+Because the copy plan is processed in key order, progress is tracked as a
+key watermark: every key at or below job.start_after has been settled, and
+the done table only holds completed keys above it. Rows below the watermark
+are pruned as it advances, so the journal stays small however large the
+bucket is. A job that finishes with no failures removes its journal.
+"""
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS job (
+    job_id TEXT PRIMARY KEY,
+    source_bucket TEXT NOT NULL,
+    dest_bucket TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    sync INTEGER NOT NULL,
+    delete_extra INTEGER NOT NULL,
+    start_after TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS done (key TEXT PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS failed (key TEXT PRIMARY KEY, size INTEGER) WITHOUT ROWID;
+"""
+
+
+class CopyJournal:
+    """
+    Append-only progress journal for one copy job.
+
+    The producer groups the copy plan into chunks with open_chunk() and
+    close_chunk(); workers report each copy with record(). Records are
+    buffered and written in a single transaction every flush_every records
+    or flush_interval seconds, whichever comes first.
+    """
+
+    def __init__(self, path: Path, flush_every: int = 1000, flush_interval: float = 2.0):
+        self.path = Path(path)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._last_flush = time.monotonic()
+        # chunk_no -> [end_key, total, settled, closed]
+        self._chunks = {}
+        self._failed = {row[0] for row in self._conn.execute('SELECT key FROM failed')}
+        self.finished = False
+
+    @classmethod
+    def create(
+        cls,
+        journal_dir: str,
+        source_bucket: str,
+        dest_bucket: str,
+        prefix: str = '',
+        sync: bool = False,
+        delete: bool = False,
+        job_id: str = None
+    ) -> 'CopyJournal':
+        """Start a new job journal and return it."""
+        job_id = job_id or uuid.uuid4().hex[:12]
+        Path(journal_dir).mkdir(parents=True, exist_ok=True)
+        path = Path(journal_dir) / f'{job_id}.db'
+        if path.exists():
+            raise FileExistsError(f"Journal for job {job_id} already exists: {path}")
+
+        journal = cls(path)
+        with journal._conn:
+            journal._conn.execute(
+                'INSERT INTO job (job_id, source_bucket, dest_bucket, prefix, sync, delete_extra, created_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, source_bucket, dest_bucket, prefix, int(sync), int(delete), time.time())
+            )
+        return journal
+
+    @classmethod
+    def open(cls, journal_dir: str, job_id: str) -> 'CopyJournal':
+        """Open the journal of an existing job for resuming."""
+        path = Path(journal_dir) / f'{job_id}.db'
+        if not path.exists():
+            raise FileNotFoundError(f"No journal found for job {job_id} in {journal_dir}")
+        return cls(path)
+
+    @property
+    def job(self) -> dict:
+        """Job parameters and durable watermark."""
+        cur = self._conn.execute('SELECT * FROM job')
+        row = cur.fetchone()
+        return dict(zip([c[0] for c in cur.description], row))
+
+    def completed_keys(self) -> set:
+        """Keys above the watermark that finished in a previous run."""
+        return {row[0] for row in self._conn.execute('SELECT key FROM done')}
+
+    def failed_objects(self) -> list:
+        """
+        Objects at or below the watermark that failed in a previous run, as
+        minimal object summaries. Failures above the watermark are picked up
+        again by the resumed listing.
+        """
+        start_after = self.job['start_after']
+        if start_after is None:
+            return []
+        return [
+            {'Key': key, 'Size': size}
+            for key, size in self._conn.execute(
+                'SELECT key, size FROM failed WHERE key <= ?', (start_after,)
+            )
+        ]
+
+    def open_chunk(self, chunk_no: int) -> None:
+        """Register a new chunk of the copy plan before its items are queued."""
+        with self._lock:
+            self._chunks[chunk_no] = [None, 0, 0, False]
+
+    def close_chunk(self, chunk_no: int, end_key: str, total: int) -> None:
+        """Mark a chunk fully queued: its last key and number of copies queued."""
+        with self._lock:
+            chunk = self._chunks[chunk_no]
+            chunk[0], chunk[1], chunk[3] = end_key, total, True
+            self._maybe_flush()
+
+    def record(self, chunk_no: Optional[int], key: str, ok: bool, size: int = None) -> None:
+        """
+        Record a settled copy. Failed copies still settle their chunk but are
+        kept in the failed table so a resumed job retries them first.
+        """
+        with self._lock:
+            self._pending.append((chunk_no, key, ok, size))
+            self._maybe_flush()
+
+    def finish(self) -> None:
+        """Flush outstanding records and mark the job finished if nothing failed."""
+        with self._lock:
+            self._flush()
+            failed = self._conn.execute('SELECT COUNT(*) FROM failed').fetchone()[0]
+            if not failed and not self._chunks:
+                with self._conn:
+                    self._conn.execute('UPDATE job SET finished_at = ?', (time.time(),))
+                self.finished = True
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+        self._conn.close()
+
+    def remove(self) -> None:
+        """Close the journal and delete its files (and the directory, if left empty)."""
+        self.close()
+        for suffix in ('', '-wal', '-shm'):
+            Path(f'{self.path}{suffix}').unlink(missing_ok=True)
+        try:
+            self.path.parent.rmdir()
+        except OSError:
+            pass
+
+    def _maybe_flush(self) -> None:
+        if (len(self._pending) >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self._flush()
+
+    def _flush(self) -> None:
+        pending, self._pending = self._pending, []
+        self._last_flush = time.monotonic()
+
+        for chunk_no, key, ok, _ in pending:
+            if chunk_no is not None:
+                self._chunks[chunk_no][2] += 1
+            if not ok:
+                self._failed.add(key)
+
+        # Advance the watermark over the leading run of fully settled chunks
+        watermark = None
+        for chunk_no in sorted(self._chunks):
+            end_key, total, settled, closed = self._chunks[chunk_no]
+            if not closed or settled < total:
+                break
+            watermark = end_key
+            del self._chunks[chunk_no]
+
+        with self._conn:
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO done (key) VALUES (?)',
+                ((key,) for chunk_no, key, ok, _ in pending if ok and chunk_no is not None)
+            )
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO failed (key, size) VALUES (?, ?)',
+                ((key, size) for _, key, ok, size in pending if not ok)
+            )
+            self._conn.executemany(
+                'DELETE FROM failed WHERE key = ?',
+                ((key,) for _, key, ok, _ in pending if ok and key in self._failed)
+            )
+            if watermark is not None:
+                self._conn.execute('UPDATE job SET start_after = ?', (watermark,))
+                self._conn.execute('DELETE FROM done WHERE key <= ?', (watermark,))
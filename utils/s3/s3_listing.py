@@ -0,0 +1,160 @@
+"""
+Key-range sharded listing shared by the S3 utilities.
+
+A single paginator returns at most 1,000 keys per round trip. iter_pages
+splits the keyspace under a prefix into disjoint ranges and lists them
+concurrently, using delimiter-discovered common prefixes as split points
+when the bucket has a folder structure and first-character boundaries
+otherwise. Each range (lo, hi] is listed with StartAfter/KeyMarker=lo and
+stops at the first key past hi, so every key is listed exactly once.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+
+# Fallback split characters for buckets without a delimiter structure
+SPLIT_CHARS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+_DONE = object()
+
+
+def split_points(client, bucket: str, prefix: str = '', max_shards: int = 16, delimiter: str = '/') -> list:
+    """
+    Choose up to max_shards - 1 sorted keys that split the keyspace under prefix.
+
+    Args:
+        client: boto3 S3 client
+        bucket: Bucket name
+        prefix: Prefix to split
+        max_shards: Maximum number of ranges to produce
+        delimiter: Delimiter used to discover common prefixes
+
+    Returns:
+        Sorted list of split keys (range upper bounds, inclusive)
+    """
+    if max_shards < 2:
+        return []
+
+    resp = client.list_objects_v2(Bucket=bucket, Prefix=prefix, Delimiter=delimiter)
+    points = [cp['Prefix'] for cp in resp.get('CommonPrefixes', [])]
+    if len(points) < 2 or resp.get('IsTruncated'):
+        points = [prefix + c for c in SPLIT_CHARS]
+
+    # Subsample evenly; the last range is open-ended so it needs no point
+    if len(points) >= max_shards:
+        points = [points[i * len(points) // max_shards] for i in range(1, max_shards)]
+    return points
+
+
+def _list_range(client, bucket: str, prefix: str, versions: bool, lo: str, hi: str) -> Iterator[dict]:
+    """Yield pages covering keys in (lo, hi]; open-ended where lo/hi is None."""
+    if versions:
+        paginator = client.get_paginator('list_object_versions')
+        params = {'Bucket': bucket, 'Prefix': prefix}
+        if lo is not None:
+            params['KeyMarker'] = lo
+        fields = ('Versions', 'DeleteMarkers')
+    else:
+        paginator = client.get_paginator('list_objects_v2')
+        params = {'Bucket': bucket, 'Prefix': prefix}
+        if lo is not None:
+            params['StartAfter'] = lo
+        fields = ('Contents',)
+
+    for page in paginator.paginate(**params):
+        if hi is None:
+            yield {field: page.get(field, []) for field in fields}
+            continue
+        trimmed = {field: [o for o in page.get(field, []) if o['Key'] <= hi] for field in fields}
+        yield trimmed
+        if any(len(trimmed[f]) < len(page.get(f, [])) for f in fields):
+            return
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put with periodic checks so producers exit once the consumer is gone."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def iter_pages(
+    client,
+    bucket: str,
+    prefix: str = '',
+    versions: bool = False,
+    start_after: str = None,
+    shards: int = 1,
+    max_workers: int = 8,
+    ordered: bool = True,
+    prefetch: int = 4
+) -> Iterator[dict]:
+    """
+    List a bucket as a stream of pages, optionally sharded by key range.
+
+    Pages have the shape of the underlying API response restricted to the
+    listing fields: {'Contents': [...]} for objects, or {'Versions': [...],
+    'DeleteMarkers': [...]} with versions=True.
+
+    Args:
+        client: boto3 S3 client
+        bucket: Bucket name
+        prefix: Optional prefix to filter keys
+        versions: List object versions and delete markers instead of objects
+        start_after: Optional key to start listing after (exclusive)
+        shards: Number of key ranges to list concurrently (1 = serial)
+        max_workers: Maximum number of ranges listed at the same time
+        ordered: Yield pages in global key order (ranges are drained in order
+            while later ranges prefetch) instead of as soon as they arrive
+        prefetch: Pages buffered per range (ordered) or per worker (unordered)
+
+    Yields:
+        Listing pages
+    """
+    points = [p for p in split_points(client, bucket, prefix, shards)
+              if start_after is None or p > start_after]
+    bounds = list(zip([start_after] + points, points + [None]))
+    if len(bounds) == 1:
+        yield from _list_range(client, bucket, prefix, versions, start_after, None)
+        return
+
+    stop = threading.Event()
+    if ordered:
+        queues = [queue.Queue(maxsize=prefetch) for _ in bounds]
+    else:
+        queues = [queue.Queue(maxsize=prefetch * max_workers)] * len(bounds)
+
+    def run(q, lo, hi):
+        try:
+            for page in _list_range(client, bucket, prefix, versions, lo, hi):
+                if not _put(q, page, stop):
+                    return
+            _put(q, _DONE, stop)
+        except Exception as e:
+            _put(q, e, stop)
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(bounds)))
+    try:
+        for q, (lo, hi) in zip(queues, bounds):
+            executor.submit(run, q, lo, hi)
+
+        pending = len(bounds)
+        for q in (queues if ordered else queues[:1]):
+            while pending:
+                item = q.get()
+                if isinstance(item, Exception):
+                    raise item
+                if item is _DONE:
+                    pending -= 1
+                    if ordered:
+                        break
+                    continue
+                yield item
+    finally:
+        stop.set()
+        executor.shutdown(wait=False)
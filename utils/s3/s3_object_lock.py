@@ -0,0 +1,77 @@
+"""
+Object Lock probes shared by the S3 utilities.
+
+object_lock_enabled is checked once per bucket so callers can skip
+per-version probes entirely on buckets without Object Lock. lock_status
+reads both the retention and the legal hold of one version.
+"""
+from botocore.exceptions import ClientError
+
+from s3_throttle import AdaptiveConcurrency, TokenBucket, call_with_backoff
+
+# Returned for versions that carry no lock configuration
+NOT_LOCKED_CODES = ('NoSuchObjectLockConfiguration', 'InvalidRequest')
+
+
+def object_lock_enabled(s3_client, bucket: str) -> bool:
+    """Check once per bucket whether Object Lock is enabled at all."""
+    try:
+        resp = call_with_backoff(s3_client.get_object_lock_configuration, Bucket=bucket)
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ObjectLockConfigurationNotFoundError':
+            return False
+        raise
+    return resp.get('ObjectLockConfiguration', {}).get('ObjectLockEnabled') == 'Enabled'
+
+
+def lock_status(
+    s3_client,
+    bucket: str,
+    key: str,
+    version_id: str = None,
+    limiter: AdaptiveConcurrency = None,
+    rate: TokenBucket = None
+) -> dict:
+    """
+    Read the Object Lock state of one version.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket name
+        key: Object key
+        version_id: Version to probe (None = current version)
+        limiter: Optional adaptive concurrency limiter
+        rate: Optional token bucket shared by all probes
+
+    Returns:
+        Dict with 'Mode' and 'RetainUntilDate' (None when there is no
+        retention) and 'LegalHold' (bool)
+    """
+    params = {'Bucket': bucket, 'Key': key}
+    if version_id:
+        params['VersionId'] = version_id
+    status = {'Mode': None, 'RetainUntilDate': None, 'LegalHold': False}
+
+    try:
+        resp = call_with_backoff(
+            s3_client.get_object_retention,
+            limiter=limiter, rate=rate, expected_codes=NOT_LOCKED_CODES, **params
+        )
+        retention = resp.get('Retention') or {}
+        status['Mode'] = retention.get('Mode')
+        status['RetainUntilDate'] = retention.get('RetainUntilDate')
+    except ClientError as e:
+        if e.response['Error']['Code'] not in NOT_LOCKED_CODES:
+            raise
+
+    try:
+        resp = call_with_backoff(
+            s3_client.get_object_legal_hold,
+            limiter=limiter, rate=rate, expected_codes=NOT_LOCKED_CODES, **params
+        )
+        status['LegalHold'] = resp.get('LegalHold', {}).get('Status') == 'ON'
+    except ClientError as e:
+        if e.response['Error']['Code'] not in NOT_LOCKED_CODES:
+            raise
+
+    return status
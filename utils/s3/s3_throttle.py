@@ -0,0 +1,245 @@
+"""
+Adaptive concurrency and throttle-aware retries shared by the S3 utilities.
+
+AdaptiveConcurrency is an AIMD (additive increase, multiplicative decrease)
+limiter on in-flight requests: after each healthy window of requests it
+admits one more, and on throttling (SlowDown / 503 and friends) it halves.
+call_with_backoff retries throttled calls with full-jitter exponential
+backoff instead of surfacing them as failures. TokenBucket caps the request
+rate for APIs with per-second quotas, independent of concurrency.
+
+botocore's own retries would hide throttles from the limiter (it only sees
+one after botocore has given up) and send requests that never took a
+token, so clients used with call_with_backoff must be built with retries
+off: get_client('s3', max_attempts=NO_RETRIES). call_with_backoff then also
+retries the transient errors botocore would have retried.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError, HTTPClientError
+
+logger = logging.getLogger(__name__)
+
+# botocore max_attempts for clients whose calls go through call_with_backoff
+NO_RETRIES = 1
+
+THROTTLE_CODES = {
+    'SlowDown',
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestLimitExceeded',
+    'RequestThrottled',
+    'TooManyRequestsException',
+    'ServiceUnavailable',
+}
+
+# Server-side errors worth retrying that are not throttles
+TRANSIENT_CODES = {
+    'InternalError',
+    'RequestTimeout',
+    'RequestTimeoutException',
+}
+
+
+def is_throttle(error: ClientError) -> bool:
+    """Return True if a ClientError is a throttling / slow-down response."""
+    code = error.response.get('Error', {}).get('Code')
+    status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    return code in THROTTLE_CODES or status in (429, 503)
+
+
+def is_transient(error: Exception) -> bool:
+    """Return True for connection failures and 5xx errors worth retrying."""
+    if isinstance(error, (BotocoreConnectionError, HTTPClientError)):
+        return True
+    if not isinstance(error, ClientError):
+        return False
+    code = error.response.get('Error', {}).get('Code')
+    status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    return code in TRANSIENT_CODES or status in (500, 502, 504)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limiter for the number of requests in flight.
+
+    Requests are grouped into windows of `limit` completions. A window
+    raises the limit by one when its error rate is at most max_error_rate and
+    its mean latency stays within latency_factor of the best window seen so
+    far. A throttle halves the limit, at most once per cooldown seconds so a
+    burst of 503s counts as one congestion signal.
+    """
+
+    def __init__(
+        self,
+        initial: int = 8,
+        minimum: int = 1,
+        maximum: int = 64,
+        latency_factor: float = 2.0,
+        max_error_rate: float = 0.05,
+        cooldown: float = 1.0
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(initial, maximum))
+        self.latency_factor = latency_factor
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._baseline = None
+        self._last_decrease = 0.0
+        self._reset_window()
+
+    def _reset_window(self) -> None:
+        self._window_ok = 0
+        self._window_errors = 0
+        self._window_latency = 0.0
+
+    @contextmanager
+    def slot(self):
+        """Hold one in-flight slot for the duration of a request."""
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify()
+
+    def on_success(self, latency: float) -> None:
+        with self._cond:
+            self._window_ok += 1
+            self._window_latency += latency
+            self._maybe_close_window()
+
+    def on_error(self) -> None:
+        """Record a non-throttling failure (counts against the error rate)."""
+        with self._cond:
+            self._window_errors += 1
+            self._maybe_close_window()
+
+    def on_throttle(self) -> None:
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self._last_decrease = now
+                new_limit = max(self.minimum, self.limit // 2)
+                if new_limit != self.limit:
+                    logger.warning(f"Throttled: reducing concurrency {self.limit} -> {new_limit}")
+                self.limit = new_limit
+            self._reset_window()
+
+    def _maybe_close_window(self) -> None:
+        completed = self._window_ok + self._window_errors
+        if completed < self.limit:
+            return
+
+        error_rate = self._window_errors / completed
+        mean_latency = self._window_latency / self._window_ok if self._window_ok else None
+        if mean_latency is not None:
+            self._baseline = mean_latency if self._baseline is None else min(self._baseline, mean_latency)
+
+        healthy = (
+            error_rate <= self.max_error_rate
+            and mean_latency is not None
+            and mean_latency <= self._baseline * self.latency_factor
+        )
+        if healthy and self.limit < self.maximum:
+            self.limit += 1
+            self._cond.notify()
+        self._reset_window()
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second up to `burst`; each
+    request takes one token and callers block until one is available.
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Block until `tokens` are available, then take them."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def call_with_backoff(
+    fn,
+    *args,
+    limiter: AdaptiveConcurrency = None,
+    rate: TokenBucket = None,
+    max_attempts: int = 8,
+    base_delay: float = 0.2,
+    max_delay: float = 20.0,
+    expected_codes: tuple = (),
+    **kwargs
+):
+    """
+    Call fn(*args, **kwargs), retrying throttling and transient errors
+    (connection failures, 5xx) with full jitter.
+
+    fn should be a method of a client built with max_attempts=NO_RETRIES,
+    so each HTTP request is one attempt here. When a limiter is given the
+    call holds one of its slots and reports its latency, errors or
+    throttling back to it. When a rate bucket is given every attempt takes
+    a token first. Other errors, and retryable ones on the final attempt,
+    are raised to the caller.
+
+    expected_codes are error codes that answer the request rather than fail
+    it (e.g. NoSuchObjectLockConfiguration for an unlocked version): they
+    are raised without retrying but count as successes for the limiter, so
+    they do not hold its error rate up.
+    """
+    for attempt in range(1, max_attempts + 1):
+        if rate:
+            rate.acquire()
+        with limiter.slot() if limiter else nullcontext():
+            start = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            except (ClientError, BotocoreConnectionError, HTTPClientError) as e:
+                if isinstance(e, ClientError) and e.response.get('Error', {}).get('Code') in expected_codes:
+                    if limiter:
+                        limiter.on_success(time.monotonic() - start)
+                    raise
+                throttled = isinstance(e, ClientError) and is_throttle(e)
+                if limiter:
+                    if throttled:
+                        limiter.on_throttle()
+                    else:
+                        limiter.on_error()
+                if not (throttled or is_transient(e)) or attempt == max_attempts:
+                    raise
+            else:
+                if limiter:
+                    limiter.on_success(time.monotonic() - start)
+                return result
+        # Back off outside the slot so other requests can use it
+        time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))